@@ -0,0 +1,224 @@
+'''Local stand-in for the Central Set dyn_api, for the benchmarks
+
+Serves /dyn_api/login, /dyn_api/admin/*, /dyn_api/crud/*, /dyn_api/etl/* and
+/upload with a configurable latency, payload size and error rate. The read
+table is virtual (rows are built from the offset, never held in memory) and
+the ETL / REPORT / BASE has `items` items per step.
+
+    python benchmarks/mock_server.py --port 8765 --latency 0.005 --error-rate 0.01
+'''
+import argparse
+import gzip
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+class MockServer():
+    '''dyn_api mock, start() serves it from a daemon thread'''
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0, etl_latency: float = 0.05, payload_size: int = 64, error_rate: float = 0, rows: int = 1000000, items: int = 10, seed: int = None):
+        self.latency = latency
+        self.etl_latency = etl_latency
+        self.payload_size = payload_size
+        self.error_rate = error_rate
+        self.rows = rows
+        self.items = items
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+    def start(self):
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+        return self
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        return self
+    def __enter__(self):
+        return self.start()
+    def __exit__(self, *exc):
+        self.stop()
+    def should_fail(self) -> bool:
+        '''count the request and draw the injected error'''
+        with self.lock:
+            self.requests += 1
+            fail = self.error_rate > 0 and self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return fail
+    def get_row(self, i: int) -> dict:
+        '''row i of the virtual table'''
+        return {
+            'id': i + 1,
+            'name': f'name {i + 1}',
+            'value': i * 0.5,
+            'active': i % 2 == 0,
+            'created_at': '2023-11-18T11:22:37',
+            'payload': 'x' * self.payload_size
+        }
+    def read(self, params: dict) -> dict:
+        '''crud/read: the ETL / REPORT / BASE tables (no saved logs) or a page of the virtual table'''
+        table = params.get('table')
+        if isinstance(table, list):
+            return {'success': True, 'data': self.get_etl_data(table)}
+        if table == 'etl_report_base_log':
+            return {'success': True, 'data': []}
+        if isinstance(table, str) and table.startswith(('etl_report_base', 'etl_rb')):
+            rows = self.get_etl_data([table]).get(table, {}).get('data', [])
+            if params.get('fields'):
+                rows = [{f: row.get(f) for f in params.get('fields')} for row in rows]
+            return {'success': True, 'data': rows}
+        offset, limit = params.get('offset') or 0, params.get('limit')
+        end = self.rows if not limit or limit < 0 else min(self.rows, offset + limit)
+        rows = [self.get_row(i) for i in range(offset, end)]
+        if params.get('fields'):
+            rows = [{f: row.get(f) for f in params.get('fields')} for row in rows]
+        return {'success': True, 'data': rows, 'n_rows': self.rows}
+    def get_etl_report_base(self) -> dict:
+        return {
+            'etl_report_base_id': 1,
+            'etl_report_base': 'BENCH',
+            'periodicity_id': 1,
+            'includes_data_quality': True,
+            'includes_data_reconci': True,
+            'includes_exports': True,
+            'includes_notify': True
+        }
+    def get_etl_data(self, tables: list) -> dict:
+        '''get_data: items per step, one data quality / notify'''
+        n = self.items
+        data = {table: {'data': []} for table in tables}
+        data['etl_report_base'] = {'data': [self.get_etl_report_base()]}
+        data['etl_rbase_input'] = {'data': [
+            {'etl_rbase_input': f'input_{i}', 'etl_rbase_input_conf': '{}', 'active': True} for i in range(n)
+        ]}
+        data['etl_rbase_output'] = {'data': [{'etl_rbase_output': f'output_{i}', 'active': True} for i in range(n)]}
+        data['etl_rbase_quality'] = {'data': [
+            {'etl_rbase_quality': f'quality_{i}', 'etl_rbase_quality_id': i + 1, 'active': True} for i in range(n)
+        ]}
+        data['etl_rb_reconcilia'] = {'data': [{'etl_rb_reconcilia': f'reconcilia_{i}', 'active': True} for i in range(n)]}
+        data['etl_rbase_export'] = {'data': [{'etl_rbase_export': f'export_{i}', 'active': True} for i in range(n)]}
+        data['etl_rbase_notify'] = {'data': [
+            {'notify_subject': 'BENCH', 'notify_body': '{{etl_report_base_log}} name success msg', 'active': True}
+        ]}
+        return data
+    def write(self, params: dict) -> dict:
+        '''crud/create | update | delete: one _row_exec_N entry per row'''
+        table, rows = params.get('table'), params.get('data') or []
+        if isinstance(rows, dict):
+            rows = [rows]
+        return {
+            'success': True,
+            'msg': 'Operation executed successfully!',
+            'data': {
+                f'{table}_row_exec_{i + 1}': {'success': True, 'inserted_primary_key': i + 1}
+                for i in range(len(rows))
+            }
+        }
+    def etl(self, action: str, payload: dict) -> dict:
+        '''etl/{action}: waits etl_latency, data quality returns the checks'''
+        time.sleep(self.etl_latency)
+        res = {'success': True, 'msg': 'ok', 'n_rows': 1000, 'n_cols': 10}
+        if action == 'data_quality':
+            res['data'] = {'check': {i + 1: 0 for i in range(self.items)}, 'fix': {}}
+        elif action in ['export', 'data_reconcilia']:
+            res['data'] = [{'date_ref': payload.get('date_ref', [None])[0], 'msg': 'ok'}]
+        return res
+    def get_handler(self):
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            def log_message(self, *args):
+                pass
+            def reply(self, status: int, res: dict):
+                body = json.dumps(res).encode()
+                if 'gzip' in self.headers.get('Accept-Encoding', '') and len(body) > 1024:
+                    body = gzip.compress(body, 1)
+                    encoding = 'gzip'
+                else:
+                    encoding = None
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if encoding:
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.should_fail():
+                    return self.reply(503, {'success': False, 'msg': 'Injected error'})
+                path = self.path.split('?')[0]
+                if path.startswith('/upload'):
+                    chunk, chunks = get_form_field(body, 'chunk'), get_form_field(body, 'chunks')
+                    if chunks is None:
+                        return self.reply(200, {'success': True, 'msg': 'uploaded', 'size': len(body)})
+                    assembled = int(chunk) == int(chunks) - 1 # THE PARTS ARE NOT KEPT, THE LAST ONE ASSEMBLES
+                    return self.reply(200, {'success': True, 'msg': 'assembled' if assembled else 'chunk', 'assembled': assembled, 'size': len(body)})
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    return self.reply(400, {'success': False, 'msg': 'Only json bodies are supported'})
+                data = payload.get('data') or {}
+                if path == '/dyn_api/login/login':
+                    res = {'success': True, 'token': 'bench-token'}
+                elif path == '/dyn_api/admin/apps':
+                    res = {'success': True, 'data': [{'app_id': 1, 'app': 'ADMIN', 'db': 'ADMIN_DB'}]}
+                elif path == '/dyn_api/admin/tables':
+                    res = {'success': True, 'data': {}}
+                elif path == '/dyn_api/crud/read':
+                    res = server.read(data)
+                elif path == '/dyn_api/crud/query':
+                    res = server.read({'limit': data.get('limit', 1000)})
+                elif re.match(r'^/dyn_api/crud/(create|update|delete)$', path):
+                    res = server.write(data)
+                elif path.startswith('/dyn_api/etl/'):
+                    res = server.etl(path.rsplit('/', 1)[1], data)
+                else:
+                    return self.reply(404, {'success': False, 'msg': f'Unknown path {path}'})
+                self.reply(200, res)
+        return Handler
+def get_form_field(body: bytes, name: str) -> str:
+    '''value of a field of a multipart form body, None when missing'''
+    match = re.search(rb'name="' + name.encode('utf-8') + rb'"\r\n\r\n([^\r]*)\r\n', body)
+    return match.group(1).decode('utf-8') if match else None
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'dyn_api mock server')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--latency', type = float, default = 0, help = 'seconds added to every request')
+    parser.add_argument('--etl-latency', type = float, default = 0.05, help = 'seconds an etl/* call takes')
+    parser.add_argument('--payload-size', type = int, default = 64, help = 'bytes of filler per row')
+    parser.add_argument('--error-rate', type = float, default = 0, help = 'share of requests answered with a 503')
+    parser.add_argument('--rows', type = int, default = 1000000, help = 'rows of the read table')
+    parser.add_argument('--items', type = int, default = 10, help = 'items per ETL step')
+    parser.add_argument('--seed', type = int, default = None)
+    return parser
+def main(argv: list = None):
+    args = get_parser().parse_args(argv)
+    server = MockServer(
+        args.host, args.port, args.latency, args.etl_latency, args.payload_size,
+        args.error_rate, args.rows, args.items, args.seed
+    )
+    print(f'SERVING: {server.url}', flush = True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+'''Benchmarks of central_set_cli against the local dyn_api mock
+
+Every scenario runs in its own process (so the peak RSS is the scenario's)
+against a mock_server.py started for the run, or against --host. Reports the
+throughput, the latency percentiles and the peak RSS, and writes them as JSON
+with --output, that --compare checks against a previous run.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --scenarios read,bulk_create --rows 200000 --compare bench.json
+'''
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+SCENARIOS = ['read', 'bulk_create', 'run_all', 'upload', 'upload_stream']
+def get_peak_rss_mb():
+    '''peak resident set size of this process in MB, None where resource is missing'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+def percentiles(values: list) -> dict:
+    '''p50 / p90 / p95 / p99 / max (nearest rank) in ms'''
+    if not values:
+        return {}
+    values = sorted(values)
+    _pick = lambda p: values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+    res = {f'p{p}': round(_pick(p) * 1000, 3) for p in [50, 90, 95, 99]}
+    res['max'] = round(values[-1] * 1000, 3)
+    res['count'] = len(values)
+    return res
+def call_latencies(cs, endpoint: str) -> list:
+    '''the api call latencies to the endpoint kept in cs.metrics'''
+    return [
+        (span['end_time_unix_nano'] - span['start_time_unix_nano']) / 1e9
+        for span in cs.metrics.get_spans()
+        if span['name'] == endpoint and 'status' in span['attributes']
+    ]
+def result(ops: int, unit: str, seconds: float, latencies: list, **extra) -> dict:
+    return {
+        'ops': ops,
+        'unit': unit,
+        'seconds': round(seconds, 4),
+        'throughput': round(ops / seconds, 2) if seconds else None,
+        'latency_ms': percentiles(latencies),
+        **extra
+    }
+def bench_read(cs, args) -> dict:
+    '''paginated read of the whole table with read_iter'''
+    rows, start = 0, time.time()
+    params = {'table': 'bench', 'limit': -1, 'join': 'none'}
+    for page in cs.read_iter(params, page_size = args.page_size, chunked = True):
+        rows += len(page)
+    seconds = time.time() - start
+    return result(rows, 'rows', seconds, call_latencies(cs, '/dyn_api/crud/read'), page_size = args.page_size)
+def bench_bulk_create(cs, args) -> dict:
+    '''bulk_create of generated rows'''
+    rows = (
+        {'name': f'name {i}', 'value': i * 0.5, 'payload': 'x' * args.payload_size}
+        for i in range(args.bulk_rows)
+    )
+    start = time.time()
+    res = cs.bulk_create('bench', rows, chunk_size = args.chunk_size, max_workers = args.workers)
+    seconds = time.time() - start
+    return result(
+        res['rows'], 'rows', seconds, call_latencies(cs, '/dyn_api/crud/create'),
+        chunk_size = args.chunk_size, workers = args.workers, failed = len(res['failed'])
+    )
+def bench_run_all(cs, args) -> dict:
+    '''get_data + run_all of a base with --items items per step'''
+    from central_set_cli import ETLReportBase
+    etl = ETLReportBase(cs)
+    conf = {action: {**_conf, 'concurrency': args.concurrency} for action, _conf in etl.allow_skip_conf.items()}
+    start = time.time()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        etl.set_allow_skip_conf(conf).get_data({'etl_report_base_id': 1}).run_all(dag = args.dag)
+    seconds = time.time() - start
+    logs = etl.get_logs()
+    return result(
+        len(logs), 'items', seconds, [log['duration'] for log in logs if log.get('duration') is not None],
+        items = args.items, concurrency = args.concurrency, dag = args.dag,
+        failed = len([log for log in logs if not log.get('success')])
+    )
+def bench_upload(cs, args, stream: bool = False) -> dict:
+    '''upload (or upload_stream) of a --upload-mb file'''
+    size = int(args.upload_mb * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = os.path.join(tmp, 'bench.bin')
+        with open(file_path, 'wb') as _file:
+            for offset in range(0, size, 1024 * 1024):
+                _file.write(os.urandom(min(1024 * 1024, size - offset)))
+        size = os.path.getsize(file_path)
+        start = time.time()
+        if stream:
+            cs.upload_stream({}, file_path, resume = False, checksum = False)
+        else:
+            cs.upload({}, file_path)
+        seconds = time.time() - start
+    return result(round(size / (1024 * 1024), 2), 'MB', seconds, [seconds])
+def run_scenario(name: str, args) -> dict:
+    '''login and run the scenario in this process'''
+    from central_set_cli import CentralSet, Metrics
+    cs = CentralSet(host = args.host, user = 'bench', password = 'bench').connect()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        cs.login()
+    cs.metrics = Metrics(max_spans = 1000000)
+    rss_before = get_peak_rss_mb()
+    try:
+        if name == 'read':
+            res = bench_read(cs, args)
+        elif name == 'bulk_create':
+            res = bench_bulk_create(cs, args)
+        elif name == 'run_all':
+            res = bench_run_all(cs, args)
+        elif name in ['upload', 'upload_stream']:
+            res = bench_upload(cs, args, stream = name == 'upload_stream')
+        else:
+            raise Exception(f'Unknown scenario {name}!')
+    except Exception as _err:
+        res = {'error': str(_err)}
+    finally:
+        cs.close()
+    res['peak_rss_mb'] = get_peak_rss_mb()
+    res['start_rss_mb'] = rss_before
+    return res
+def start_server(args):
+    '''start mock_server.py on a free port, returns (process, url)'''
+    cmd = [
+        sys.executable, os.path.join(HERE, 'mock_server.py'), '--port', '0',
+        '--latency', str(args.latency), '--etl-latency', str(args.etl_latency),
+        '--payload-size', str(args.payload_size), '--error-rate', str(args.error_rate),
+        '--rows', str(args.rows), '--items', str(args.items), '--seed', '42'
+    ]
+    proc = subprocess.Popen(cmd, stdout = subprocess.PIPE, text = True)
+    line = proc.stdout.readline().strip()
+    if not line.startswith('SERVING: '):
+        proc.kill()
+        raise Exception(f'Mock server failed to start: {line}')
+    return proc, line.split(' ', 1)[1]
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    '''print the change against the baseline, returns the regressions'''
+    regressions = []
+    print(f'{"scenario":<15}{"metric":<18}{"baseline":>12}{"current":>12}{"change":>10}')
+    for name, res in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or 'error' in res or 'error' in base:
+            continue
+        metrics = [
+            ('throughput', res.get('throughput'), base.get('throughput'), False),
+            ('latency_p95_ms', res['latency_ms'].get('p95'), base['latency_ms'].get('p95'), True),
+            ('peak_rss_mb', res.get('peak_rss_mb'), base.get('peak_rss_mb'), True),
+        ]
+        for metric, current, before, lower_is_better in metrics:
+            if not current or not before:
+                continue
+            change = (current - before) / before * 100
+            print(f'{name:<15}{metric:<18}{before:>12}{current:>12}{change:>9.1f}%')
+            if (change > threshold) if lower_is_better else (change < -threshold):
+                regressions.append(f'{name} {metric} {change:+.1f}%')
+    return regressions
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = 'central_set_cli benchmarks')
+    parser.add_argument('--scenarios', default = ','.join(SCENARIOS), help = f'comma separated, of {", ".join(SCENARIOS)}')
+    parser.add_argument('--host', default = None, help = 'dyn_api to run against, a mock server is started if not set')
+    parser.add_argument('--rows', type = int, default = 1000000, help = 'rows of the paginated read')
+    parser.add_argument('--page-size', type = int, default = 10000)
+    parser.add_argument('--bulk-rows', type = int, default = 100000, help = 'rows of the bulk create')
+    parser.add_argument('--chunk-size', type = int, default = 1000)
+    parser.add_argument('--workers', type = int, default = 4, help = 'bulk chunks in flight')
+    parser.add_argument('--items', type = int, default = 20, help = 'items per ETL step')
+    parser.add_argument('--concurrency', type = int, default = 1, help = 'items of a step run at once')
+    parser.add_argument('--dag', action = 'store_true', help = 'run_all as a dependency graph')
+    parser.add_argument('--upload-mb', type = float, default = 64)
+    parser.add_argument('--latency', type = float, default = 0.002, help = 'mock seconds per request')
+    parser.add_argument('--etl-latency', type = float, default = 0.05, help = 'mock seconds per etl call')
+    parser.add_argument('--payload-size', type = int, default = 64, help = 'bytes of filler per row')
+    parser.add_argument('--error-rate', type = float, default = 0, help = 'share of mock requests failing with 503')
+    parser.add_argument('--output', default = None, help = 'write the results JSON here')
+    parser.add_argument('--compare', default = None, help = 'baseline results JSON')
+    parser.add_argument('--threshold', type = float, default = 10, help = 'regression threshold in %%')
+    parser.add_argument('--child', default = None, help = argparse.SUPPRESS)
+    return parser
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = get_parser().parse_args(argv)
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args)))
+        return 0
+    server = None
+    if not args.host:
+        server, args.host = start_server(args)
+    results = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {k: v for k, v in vars(args).items() if k not in ['child', 'output', 'compare']}
+        },
+        'scenarios': {}
+    }
+    try:
+        for name in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+            print(f'RUNNING: {name}...', flush = True)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *argv, '--host', args.host, '--child', name],
+                stdout = subprocess.PIPE, text = True
+            )
+            lines = proc.stdout.strip().splitlines()
+            try:
+                res = json.loads(lines[-1])
+            except (IndexError, ValueError):
+                res = {'error': f'scenario exited with {proc.returncode}'}
+            results['scenarios'][name] = res
+            print(json.dumps(res), flush = True)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as _file:
+            json.dump(results, _file, indent = 2)
+    if args.compare:
+        with open(args.compare, 'r', encoding = 'utf-8') as _file:
+            regressions = compare(results, json.load(_file), args.threshold)
+        if regressions:
+            print('REGRESSIONS: ' + '; '.join(regressions))
+            return 1
+    return 0
+if __name__ == '__main__':
+    sys.exit(main())
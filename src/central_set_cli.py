@@ -2,19 +2,50 @@
 # pylint: disable = broad-exception-raised
 # pylint: disable = broad-exception-caught
 # pylint: disable = unused-import
+from __future__ import annotations
 import re
 import os
-from dataclasses import dataclass, asdict
+import queue
+import random
+from dataclasses import dataclass, field
 from typing import Optional
 import copy
 import datetime
+import fnmatch
+import functools
+import base64
+import gzip
+import hashlib
+import heapq
+import importlib
+import calendar
+import contextlib
 import json
 import sys
+import atexit
+import unicodedata
+import uuid
+import tempfile
+import threading
 import time
-from dateutil import parser
-import requests
-from dotenv import load_dotenv
-load_dotenv()
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+class LazyModule():
+    '''module imported on the first attribute access, keeps the import of the cli fast'''
+    def __init__(self, name: str):
+        self.name = name
+    def __getattr__(self, attr: str):
+        return getattr(importlib.import_module(self.name), attr)
+asyncio = LazyModule('asyncio')
+parser = LazyModule('dateutil.parser')
+requests = LazyModule('requests')
+sqlite3 = LazyModule('sqlite3')
+@functools.lru_cache(maxsize = None)
+def load_env() -> bool:
+    '''load the .env once, on the first Init'''
+    return importlib.import_module('dotenv').load_dotenv()
 
 @dataclass
 class ReadParams:
@@ -32,7 +63,7 @@ class ReadParams:
     join: str = 'all'
     def get_dict(self) -> dict:
         '''returns the field in the dict format'''
-        return {k: v for k, v in asdict(self).items()}
+        return {k: getattr(self, k) for k in self.__dataclass_fields__}
 @dataclass
 class CreateParams:
     '''CREATE DATA STRUCT'''
@@ -41,39 +72,864 @@ class CreateParams:
     database: str = None
     def get_dict(self) -> dict:
         '''returns the field in the dict format'''
-        return {k: v for k, v in asdict(self).items()}
+        return {k: getattr(self, k) for k in self.__dataclass_fields__}
+def get_cache_dir() -> str:
+    '''local cache folder, CS_CACHE_DIR or ~/.cache/central_set'''
+    load_env()
+    return os.environ.get('CS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'central_set')
+class MetadataCache():
+    '''LRU cache with per entry TTL, optionally persisted in a json file
+
+    Each entry records the tables it was read from, so a write to one of
+    them can invalidate it.
+    '''
+    def __init__(self, max_size: int = 256, ttl: float = 3600, path: str = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        if self.path:
+            self.load()
+    def get(self, key: str, default = None):
+        '''return a copy of the cached value, default when missing or expired'''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            if entry['expires'] is not None and entry['expires'] < time.time():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return copy.deepcopy(entry['value'])
+    def set(self, key: str, value, tables: list = None, ttl: float = None):
+        '''cache a copy of the value'''
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.entries[key] = {
+                'value': copy.deepcopy(value),
+                'tables': list(tables or []),
+                'expires': time.time() + ttl if ttl else None
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last = False)
+            self.save()
+        return value
+    def invalidate(self, table: str = None):
+        '''drop the entries read from the table, or all of them'''
+        with self.lock:
+            for key in list(self.entries):
+                if table is None or table in self.entries[key]['tables']:
+                    del self.entries[key]
+            self.save()
+        return self
+    def load(self):
+        '''load the not expired entries from the path'''
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding = 'utf-8') as _file:
+                entries = json.load(_file)
+        except Exception as _err:
+            print('CACHE LOAD ERR: ', str(_err))
+            return self
+        now = time.time()
+        with self.lock:
+            for key, entry in entries.items():
+                if entry.get('expires') is None or entry['expires'] > now:
+                    self.entries[key] = entry
+        return self
+    def save(self):
+        '''persist the entries in the path'''
+        if not self.path:
+            return self
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding = 'utf-8') as _file:
+                json.dump(self.entries, _file, default = str)
+            os.replace(tmp, self.path)
+        return self
+    @staticmethod
+    def get_path(host: str, app: str = None, user: str = None, folder: str = None) -> str:
+        '''default cache file for the host / app / user'''
+        folder = folder or get_cache_dir()
+        name = hashlib.sha1(f'{host}|{app}|{user}'.encode('utf-8')).hexdigest()
+        return os.path.join(folder, f'{name}.json')
+def json_default(obj):
+    '''json.dumps default for StepLog records, dates and other objects'''
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    return str(obj)
+def rows_to_columns(rows: list, fields: list = None) -> dict:
+    '''column lists from the rows (dicts or StepLog records), in the fields order'''
+    if fields is None:
+        fields = []
+        for row in rows:
+            for k in (row.keys() if hasattr(row, 'keys') else []):
+                if k not in fields:
+                    fields.append(k)
+    return {f: [row.get(f) for row in rows] for f in fields}
+def columns_to_frame(columns: dict, kind: str = 'pandas', types: dict = None):
+    '''pandas DataFrame or pyarrow Table from the columns, converted column-wise
+
+    types maps columns to "datetime", "date", "int", "float", "bool" or "str".
+    '''
+    types = types or {}
+    if kind == 'pandas':
+        try:
+            import pandas as pd
+        except ImportError as _err:
+            raise Exception('pandas is required, pip install pandas') from _err
+        pd_types = {'int': 'Int64', 'float': 'Float64', 'bool': 'boolean', 'str': 'string'}
+        frame = {}
+        for k, values in columns.items():
+            _type = types.get(k)
+            if _type in ['datetime', 'date']:
+                try:
+                    frame[k] = pd.to_datetime(pd.Series(values, dtype = 'object'), errors = 'coerce', format = 'ISO8601')
+                except ValueError: # pandas < 2
+                    frame[k] = pd.to_datetime(pd.Series(values, dtype = 'object'), errors = 'coerce')
+                if _type == 'date':
+                    frame[k] = frame[k].dt.normalize()
+            elif _type in pd_types:
+                frame[k] = pd.array(values, dtype = pd_types[_type])
+            else:
+                frame[k] = values
+        return pd.DataFrame(frame)
+    if kind == 'arrow':
+        try:
+            import pyarrow as pa
+        except ImportError as _err:
+            raise Exception('pyarrow is required, pip install pyarrow') from _err
+        pa_types = {
+            'datetime': pa.timestamp('us'), 'date': pa.date32(), 'int': pa.int64(),
+            'float': pa.float64(), 'bool': pa.bool_(), 'str': pa.string()
+        }
+        arrays = {}
+        for k, values in columns.items():
+            _type = types.get(k)
+            if _type in ['datetime', 'date']:
+                arrays[k] = pa.array(values, type = pa.string()).cast(pa.timestamp('us'))
+                if _type == 'date':
+                    arrays[k] = arrays[k].cast(pa.date32())
+            elif _type in pa_types:
+                arrays[k] = pa.array(values, type = pa_types[_type])
+            else:
+                arrays[k] = pa.array(values)
+        return pa.table(arrays)
+    raise Exception(f'Unknown frame kind {kind}, use pandas or arrow!')
+def infer_types(columns: dict, types: dict = None) -> dict:
+    '''column types for columns_to_frame, ISO date / datetime strings detected from the first value'''
+    types = dict(types or {})
+    for k, values in columns.items():
+        if k in types:
+            continue
+        value = next((v for v in values if v is not None), None)
+        if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$', value):
+            types[k] = 'date' if len(value) == 10 else 'datetime'
+    return types
+def concat_frames(frames: list, kind: str = 'pandas'):
+    '''concatenate the page frames'''
+    if kind == 'arrow':
+        import pyarrow as pa
+        try:
+            return pa.concat_tables(frames, promote_options = 'default')
+        except TypeError: # pyarrow < 14
+            return pa.concat_tables(frames, promote = True)
+    import pandas as pd
+    return pd.concat(frames, ignore_index = True)
+class StepLog():
+    '''Log entry of a step item'''
+    __slots__ = (
+        'type', 'ref', 'name', 'start', 'success', 'msg', 'num_rows', 'num_cols',
+        'fname', 'end', 'timer', 'duration', 'etl_report_base_id', 'html', 'errors', 'fixes'
+    )
+    types = {
+        'start': 'datetime', 'end': 'datetime', 'success': 'bool', 'duration': 'float',
+        'num_rows': 'int', 'num_cols': 'int', 'etl_report_base_id': 'int'
+    }
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+    def get(self, key: str, default = None):
+        '''dict like get'''
+        return getattr(self, key, default)
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError as _err:
+            raise KeyError(key) from _err
+    def __setitem__(self, key: str, value):
+        setattr(self, key, value)
+    def __contains__(self, key: str):
+        return hasattr(self, key)
+    def keys(self) -> list:
+        '''the fields set'''
+        return [k for k in self.__slots__ if hasattr(self, k)]
+    def to_dict(self) -> dict:
+        '''returns the fields set in the dict format'''
+        return {k: getattr(self, k) for k in self.__slots__ if hasattr(self, k)}
+    def copy(self, **kwargs):
+        '''new record with the same fields and the changes'''
+        log = StepLog.__new__(StepLog)
+        for k in self.__slots__:
+            if hasattr(self, k):
+                setattr(log, k, getattr(self, k))
+        for k, v in kwargs.items():
+            setattr(log, k, v)
+        return log
+    def __repr__(self):
+        return f'StepLog({self.to_dict()})'
+@functools.lru_cache(maxsize = None)
+def optional_import(name: str):
+    '''import an optional dependency, None when it is not installed'''
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+def dumps(payload, serializer: str = 'json') -> bytes:
+    '''serialize the payload with json, orjson or msgpack'''
+    if serializer == 'orjson' and optional_import('orjson'):
+        return optional_import('orjson').dumps(
+            payload, default = json_default, option = optional_import('orjson').OPT_NON_STR_KEYS
+        )
+    if serializer == 'msgpack':
+        if not optional_import('msgpack'):
+            raise Exception('msgpack is required, pip install msgpack')
+        return optional_import('msgpack').packb(payload, default = json_default, use_bin_type = True)
+    return json.dumps(payload, default = json_default).encode('utf-8')
+def loads(content: bytes, content_type: str = None, serializer: str = 'json'):
+    '''deserialize a response body by its content type'''
+    if content_type and 'msgpack' in content_type:
+        if not optional_import('msgpack'):
+            raise Exception('msgpack is required, pip install msgpack')
+        return optional_import('msgpack').unpackb(content, raw = False, strict_map_key = False)
+    if serializer in ['orjson', 'msgpack'] and optional_import('orjson'):
+        return optional_import('orjson').loads(content)
+    return json.loads(content)
+def compress(body: bytes, compression: str) -> bytes:
+    '''compress a request body with gzip or zstd'''
+    if compression == 'gzip':
+        return gzip.compress(body, compresslevel = 6)
+    if compression == 'zstd':
+        if not optional_import('zstandard'):
+            raise Exception('zstandard is required, pip install zstandard')
+        return optional_import('zstandard').ZstdCompressor().compress(body)
+    raise Exception(f'Unknown compression {compression}, use gzip or zstd!')
+def accept_encoding() -> str:
+    '''the response encodings the client can decode'''
+    encodings = ['gzip', 'deflate']
+    if optional_import('brotli') or optional_import('brotlicffi'):
+        encodings.append('br')
+    if optional_import('zstandard'):
+        encodings.append('zstd')
+    return ', '.join(encodings)
+@dataclass
+class RequestPolicy:
+    '''REQUEST POLICY: per endpoint (connect, read) timeouts, retries with backoff and hedging
+
+    The endpoints are path patterns (fnmatch). The idempotent ones are
+    retried on connection errors, timeouts and retry_status, and the hedged
+    ones get a duplicate request once the call takes longer than the
+    hedge_percentile of the latencies seen for that endpoint, at most
+    max_hedges of them in flight (none when they are all taken).
+    '''
+    timeouts: dict = field(default_factory = lambda: {
+        '/dyn_api/login/*': (10, 60),
+        '/dyn_api/admin/*': (10, 120),
+        '/dyn_api/crud/read': (10, 300),
+    })
+    default_timeout: tuple = (10, 1000)
+    retries: int = 2
+    backoff: float = 0.5
+    max_backoff: float = 10
+    retry_status: tuple = (429, 502, 503, 504)
+    idempotent: list = field(default_factory = lambda: ['/dyn_api/crud/read', '/dyn_api/admin/*'])
+    hedged: list = field(default_factory = lambda: ['/dyn_api/crud/read', '/dyn_api/admin/*'])
+    hedge_percentile: float = 95
+    hedge_min_samples: int = 20
+    max_hedges: int = 4
+    samples: dict = field(default_factory = dict, repr = False, compare = False)
+    hedges: int = field(default = 0, repr = False, compare = False)
+    _hedge_lock: threading.Lock = field(default_factory = threading.Lock, repr = False, compare = False)
+    def match(self, api: str, patterns: list) -> bool:
+        '''check if the api path matches one of the patterns'''
+        path = urlsplit(api).path
+        return any(fnmatch.fnmatch(path, pattern) for pattern in patterns or [])
+    def get_timeout(self, api: str) -> tuple:
+        '''(connect, read) timeout of the endpoint'''
+        path = urlsplit(api).path
+        for pattern, timeout in self.timeouts.items():
+            if fnmatch.fnmatch(path, pattern):
+                return tuple(timeout) if isinstance(timeout, (list, tuple)) else timeout
+        return self.default_timeout
+    def get_backoff(self, attempt: int) -> float:
+        '''exponential backoff with jitter'''
+        return min(self.backoff * 2 ** attempt, self.max_backoff) * random.uniform(0.5, 1)
+    def observe(self, api: str, seconds: float):
+        '''record the latency of the endpoint'''
+        path = urlsplit(api).path
+        if path not in self.samples:
+            self.samples[path] = deque(maxlen = 500)
+        self.samples[path].append(seconds)
+    def start_hedge(self) -> bool:
+        '''take one of the max_hedges, False when they are all in flight'''
+        with self._hedge_lock:
+            if self.hedges >= self.max_hedges:
+                return False
+            self.hedges += 1
+            return True
+    def end_hedge(self):
+        '''give back the hedge taken'''
+        with self._hedge_lock:
+            self.hedges -= 1
+        return self
+    def get_hedge_delay(self, api: str):
+        '''seconds to wait before the hedged request, None when not hedged'''
+        if not self.match(api, self.hedged):
+            return None
+        samples = sorted(self.samples.get(urlsplit(api).path, []))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+class Metrics():
+    '''In-process metrics of the api calls, step items and steps
+
+    Latencies go to histograms and bytes to counters, both exported as
+    Prometheus text with to_prometheus, and each call / item is also kept as
+    an OpenTelemetry-style span (the last max_spans) for get_spans.
+    '''
+    buckets: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+    def __init__(self, max_spans: int = 10000, prefix: str = 'central_set'):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.spans = deque(maxlen = max_spans)
+        self.trace_id = os.urandom(16).hex()
+        self.lock = threading.Lock()
+    def observe(self, metric: str, value: float, **labels):
+        '''add the value to the histogram'''
+        key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+        return self
+    def inc(self, metric: str, value: float = 1, **labels):
+        '''add the value to the counter'''
+        key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        return self
+    def span(self, name: str, start: float, end: float, success: bool = True, **attributes):
+        '''keep an OpenTelemetry-style span'''
+        self.spans.append({
+            'name': name,
+            'trace_id': self.trace_id,
+            'span_id': os.urandom(8).hex(),
+            'start_time_unix_nano': int(start * 1e9),
+            'end_time_unix_nano': int(end * 1e9),
+            'attributes': attributes,
+            'status': {'code': 'OK' if success else 'ERROR'}
+        })
+        return self
+    def record_call(self, api: str, status, start: float, end: float, request_bytes: int = 0, response_bytes: int = 0):
+        '''record an api call'''
+        endpoint = urlsplit(api).path
+        self.observe('api_call_seconds', end - start, endpoint = endpoint, status = status)
+        self.inc('api_request_bytes_total', request_bytes, endpoint = endpoint)
+        self.inc('api_response_bytes_total', response_bytes, endpoint = endpoint)
+        return self.span(
+            endpoint, start, end, status == 200,
+            endpoint = endpoint, status = status, request_bytes = request_bytes, response_bytes = response_bytes
+        )
+    def record_item(self, log, start: float, end: float):
+        '''record a step item from its log'''
+        success = bool(log.get('success'))
+        self.observe('item_seconds', end - start, action = log.get('type'), item = log.get('name'), success = success)
+        return self.span(
+            f'{log.get("type")}/{log.get("name")}', start, end, success,
+            action = log.get('type'), item = log.get('name'), ref = log.get('ref'), msg = log.get('msg')
+        )
+    def record_step(self, action: str, start: float, end: float):
+        '''record a step'''
+        self.observe('step_seconds', end - start, action = action)
+        return self.span(action, start, end, True, action = action)
+    def get_spans(self) -> list:
+        '''the spans kept'''
+        return list(self.spans)
+    def to_prometheus(self) -> str:
+        '''the histograms and counters in the Prometheus text format'''
+        def _labels(labels, extra = None):
+            labels = list(labels) + ([extra] if extra else [])
+            if not labels:
+                return ''
+            _esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + ','.join(f'{k}="{_esc(v)}"' for k, v in labels) + '}'
+        lines, typed = [], set()
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        for (name, labels), hist in histograms:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+            total = 0
+            for bound, count in zip(self.buckets, hist['buckets']):
+                total += count
+                lines.append(f'{metric}_bucket{_labels(labels, ("le", bound))} {total}')
+            lines.append(f'{metric}_bucket{_labels(labels, ("le", "+Inf"))} {hist["count"]}')
+            lines.append(f'{metric}_sum{_labels(labels)} {hist["sum"]}')
+            lines.append(f'{metric}_count{_labels(labels)} {hist["count"]}')
+        for (name, labels), value in counters:
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+class HostPool():
+    '''Pool of identical Central Set nodes behind one Init
+
+    Every call goes to a healthy node, the one with the fewest outstanding
+    requests per weight (strategy "least_outstanding") or a weighted random
+    one (strategy "weighted"). A node failing max_failures calls in a row
+    (connection errors, timeouts, 5xx) is left out for cooldown seconds,
+    and every check_interval seconds the nodes are probed in the background.
+    Each node keeps its own login token.
+    '''
+    strategies: tuple = ('least_outstanding', 'weighted')
+    def __init__(self, hosts, strategy: str = 'least_outstanding', check_interval: float = 30, health_path: str = '/', cooldown: float = 30, max_failures: int = 3):
+        if strategy not in self.strategies:
+            raise Exception(f'Unknown routing strategy {strategy}!')
+        if isinstance(hosts, str):
+            hosts = [hosts]
+        weights = hosts if isinstance(hosts, dict) else {host: 1 for host in hosts}
+        if not weights:
+            raise Exception('No hosts in the pool!')
+        self.nodes = [
+            {
+                'host': host.rstrip('/'),
+                'weight': float(weight),
+                'outstanding': 0,
+                'requests': 0,
+                'failures': 0,
+                'down_until': 0,
+                'token': None
+            } for host, weight in weights.items()
+        ]
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.health_path = health_path
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.last_check = time.time()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+    @property
+    def host(self) -> str:
+        return self.nodes[0]['host']
+    def is_healthy(self, node: dict) -> bool:
+        return node['down_until'] <= time.time()
+    def pick(self, exclude: dict = None) -> dict:
+        '''the node of the next call (other than exclude when there is one), taken (outstanding + 1) until release'''
+        pinned = getattr(self.local, 'node', None)
+        if self.check_interval and time.time() - self.last_check > self.check_interval:
+            self.last_check = time.time()
+            threading.Thread(target = self.check, daemon = True).start()
+        with self.lock:
+            if pinned is not None:
+                node = pinned
+            else:
+                nodes = [node for node in self.nodes if self.is_healthy(node)] or self.nodes
+                nodes = [node for node in nodes if node is not exclude] or nodes
+                if self.strategy == 'weighted':
+                    node = random.choices(nodes, weights = [n['weight'] for n in nodes])[0]
+                else:
+                    low = min(n['outstanding'] / n['weight'] for n in nodes)
+                    nodes = [n for n in nodes if n['outstanding'] / n['weight'] == low]
+                    node = random.choices(nodes, weights = [n['weight'] for n in nodes])[0]
+            node['outstanding'] += 1
+            node['requests'] += 1
+        return node
+    def release(self, node: dict, ok: bool = True):
+        '''the call to the node ended, ok False counts as a failure'''
+        with self.lock:
+            node['outstanding'] -= 1
+            if ok:
+                node['failures'] = 0
+            else:
+                node['failures'] += 1
+                if node['failures'] >= self.max_failures:
+                    node['down_until'] = time.time() + self.cooldown
+        return self
+    def pin(self, node: dict = None):
+        '''context manager sending the calls of this thread to the node (picked once if None)'''
+        pool = self
+        class _Pin():
+            def __enter__(self):
+                self.previous = getattr(pool.local, 'node', None)
+                self.node = node
+                if self.node is None:
+                    self.node = pool.pick()
+                    pool.release(self.node)
+                pool.local.node = self.node
+                return self.node
+            def __exit__(self, *exc):
+                pool.local.node = self.previous
+        return _Pin()
+    def check(self, timeout: float = 5):
+        '''probe every node, up when it answers other than 502 / 503 / 504'''
+        for node in self.nodes:
+            try:
+                r = requests.get(f'{node["host"]}{self.health_path}', timeout = timeout, verify = False)
+                ok = r.status_code not in (502, 503, 504)
+            except requests.RequestException:
+                ok = False
+            with self.lock:
+                if ok:
+                    node['failures'] = 0
+                    node['down_until'] = 0
+                else:
+                    node['down_until'] = time.time() + self.cooldown
+        return self
+    def get_stats(self) -> list:
+        '''host, weight, outstanding, requests, failures and healthy of each node'''
+        with self.lock:
+            return [
+                {**{k: v for k, v in node.items() if k not in ['token', 'down_until']}, 'healthy': self.is_healthy(node)}
+                for node in self.nodes
+            ]
+def get_token_exp(token: str):
+    '''the exp claim of a JWT (not verified), None when it has none'''
+    try:
+        claims = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(claims + '=' * (-len(claims) % 4)))
+        return float(claims['exp'])
+    except Exception:
+        return None
+class TokenCache():
+    '''Login tokens kept on disk by host / user until they expire
+
+    The expiry is the JWT exp claim, or ttl seconds after the login for other
+    tokens, and a token is no longer used margin seconds before it expires.
+    '''
+    def __init__(self, path: str = None, ttl: float = 3600, margin: float = 60):
+        self.path = path or os.path.join(get_cache_dir(), 'tokens.json')
+        self.ttl = ttl
+        self.margin = margin
+        self.lock = threading.Lock()
+    @staticmethod
+    def get_key(host: str, user: str) -> str:
+        return hashlib.sha1(f'{host}|{user}'.encode('utf-8')).hexdigest()
+    def load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding = 'utf-8') as _file:
+                return json.load(_file)
+        except ValueError:
+            return {}
+    def get(self, host: str, user: str):
+        '''(token, expires) of the host / user, None when missing or about to expire'''
+        with self.lock:
+            entry = self.load().get(self.get_key(host, user))
+        if not entry or entry['expires'] - self.margin <= time.time():
+            return None
+        return entry['token'], entry['expires']
+    def set(self, host: str, user: str, token: str) -> float:
+        '''keep the token, returns when it expires'''
+        expires = get_token_exp(token) or time.time() + self.ttl
+        with self.lock:
+            tokens = {k: v for k, v in self.load().items() if v['expires'] > time.time()}
+            tokens[self.get_key(host, user)] = {'token': token, 'expires': expires}
+            self.save(tokens)
+        return expires
+    def delete(self, host: str, user: str):
+        '''forget the token of the host / user'''
+        with self.lock:
+            tokens = self.load()
+            tokens.pop(self.get_key(host, user), None)
+            self.save(tokens)
+        return self
+    def save(self, tokens: dict):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding = 'utf-8') as _file:
+            json.dump(tokens, _file)
+        os.replace(tmp, self.path)
+        return self
 @dataclass
 class Init:
     """Initialize"""
     host: str = 'localhost'
     # port: Optional[int] = 80
-    user: str = os.environ.get('CS_USER')
-    password: str = os.environ.get('CS_PASS')
+    user: str = None
+    password: str = None
     lang: str = 'en'
-    token: str = os.environ.get('CS_TOKEN')
+    token: str = None
     apps: list = None
     app: dict = None
     tables: dict = None
+    pool_connections: int = 10
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    keep_alive: bool = True
+    cache: MetadataCache = field(default = None, repr = False, compare = False)
+    etl_cache_ttl: float = None
+    read_cache: MetadataCache = field(default = None, repr = False, compare = False)
+    serializer: str = 'json'
+    compression: str = None
+    compress_threshold: int = 64 * 1024
+    policy: RequestPolicy = field(default_factory = RequestPolicy, repr = False, compare = False)
+    metrics: Metrics = field(default_factory = Metrics, repr = False, compare = False)
+    hosts: HostPool = field(default = None, repr = False, compare = False)
+    token_cache: TokenCache = field(default = None, repr = False, compare = False)
+    token_margin: float = 60
     _r_params: ReadParams = None
     _c_params: CreateParams = None
+    _session: requests.Session = field(default = None, repr = False, compare = False)
+    _session_lock: threading.Lock = field(default_factory = threading.Lock, repr = False, compare = False)
+    _executor: ThreadPoolExecutor = field(default = None, repr = False, compare = False)
+    _inflight: dict = field(default_factory = dict, repr = False, compare = False)
+    _inflight_lock: threading.Lock = field(default_factory = threading.Lock, repr = False, compare = False)
+    _read_generation: int = field(default = 0, repr = False, compare = False)
+    _token_exp: float = field(default = None, repr = False, compare = False)
+    _token_lock: threading.Lock = field(default_factory = threading.Lock, repr = False, compare = False)
+    def __post_init__(self):
+        load_env()
+        self.user = self.user or os.environ.get('CS_USER')
+        self.password = self.password or os.environ.get('CS_PASS')
+        self.token = self.token or os.environ.get('CS_TOKEN')
+        if self.token:
+            self._token_exp = get_token_exp(self.token)
+    def get_session(self) -> requests.Session:
+        '''return the pooled keep-alive session, created on first use'''
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections = self.pool_connections,
+                        pool_maxsize     = self.pool_maxsize,
+                        pool_block       = self.pool_block
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    if not self.keep_alive:
+                        session.headers['Connection'] = 'close'
+                    self._session = session
+        return self._session
+    def close(self):
+        '''CLOSE THE POOLED CONNECTIONS'''
+        with self._session_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait = False)
+                self._executor = None
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+        return self
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+    def get_headers(self) -> dict:
+        '''return the request headers with the Bearer token'''
+        headers = {'Accept': '*/*', 'Content-type': 'application/json'}#, 'Accept': 'text/plain'}
+        if self.serializer == 'msgpack':
+            headers['Accept'] = 'application/msgpack, application/json;q=0.9'
+            headers['Content-type'] = 'application/msgpack'
+        headers['Accept-Encoding'] = accept_encoding()
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return headers
+    def shape_payload(self, payload: dict):
+        '''inject the app and lang in the payload'''
+        if self.app and isinstance(payload, dict):
+            payload['app'] = self.app
+        if self.lang and isinstance(payload, dict):
+            payload['lang'] = self.lang
+        return payload
+    def encode_body(self, payload, headers: dict) -> bytes:
+        '''serialize the payload, compressed above compress_threshold bytes'''
+        body = dumps(payload, self.serializer)
+        if self.compression and len(body) >= self.compress_threshold:
+            body = compress(body, self.compression)
+            headers['Content-Encoding'] = self.compression
+        return body
+    def decode_body(self, r: requests.Response):
+        '''deserialize the response body'''
+        return loads(r.content, r.headers.get('Content-Type'), self.serializer)
+    def get_executor(self) -> ThreadPoolExecutor:
+        '''return the executor of the hedged requests'''
+        if self._executor is None:
+            with self._session_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers = max(1, self.policy.max_hedges))
+        return self._executor
+    def _post(self, api: str, data, headers: dict) -> requests.Response:
+        start = time.time()
+        r = self.get_session().post(
+            url     = api,
+            data    = data,
+            headers = headers,
+            verify  = False,
+            timeout = self.policy.get_timeout(api)
+        )
+        self.policy.observe(api, time.time() - start)
+        return r
+    def _hedged_post(self, api: str, _api: str, node: dict, data, headers: dict) -> requests.Response:
+        '''POST the call (routed to _api / node) on the calling thread, with a duplicate once it takes longer than the
+        hedge delay, sent to another node of the host pool, that answers when the call fails'''
+        delay = self.policy.get_hedge_delay(api)
+        if delay is None or not self.policy.start_hedge():
+            return self._post(_api, data, self.get_node_headers(node, headers))
+        ended = threading.Event()
+        hedge = self.get_executor().submit(self._hedge, api, node, data, headers, delay, ended)
+        try:
+            r = self._post(_api, data, self.get_node_headers(node, headers))
+        except (requests.ConnectionError, requests.Timeout):
+            ended.set()
+            r = hedge.result()
+            if r is None or r.status_code >= 500:
+                raise
+            return r
+        ended.set()
+        if r.status_code < 500 and r.status_code not in self.policy.retry_status:
+            return r
+        _r = hedge.result()
+        return _r if _r is not None and _r.status_code < 500 and _r.status_code not in self.policy.retry_status else r
+    def _hedge(self, api: str, node: dict, data, headers: dict, delay: float, ended: threading.Event):
+        '''the duplicate of the call, None when the call ended within the delay'''
+        _node = None
+        try:
+            if ended.wait(delay):
+                return None
+            _api, _node = self.route(api, exclude = node)
+            r = self._post(_api, data, self.get_node_headers(_node, headers))
+            if _node is not None:
+                self.hosts.release(_node, r.status_code < 500)
+                _node = None
+            return r
+        except (requests.ConnectionError, requests.Timeout):
+            return None
+        finally:
+            if _node is not None:
+                self.hosts.release(_node, False)
+            self.policy.end_hedge()
+    def set_hosts(self, hosts, **kwargs):
+        '''SET A HOST POOL, the calls are spread over its nodes (a list / {host: weight} or a HostPool)'''
+        self.hosts = hosts if isinstance(hosts, HostPool) else HostPool(hosts, **kwargs)
+        self.host = self.hosts.host
+        self.pool_connections = max(self.pool_connections, len(self.hosts.nodes))
+        return self
+    def route(self, api: str, exclude: dict = None):
+        '''the api on the node of the host pool picked for the call (other than exclude when possible), returns (api, node)'''
+        if self.hosts is None or not api.startswith(self.host):
+            return api, None
+        login = api.endswith('/dyn_api/login/login')
+        for _ in self.hosts.nodes:
+            node = self.hosts.pick(exclude)
+            if node['token'] is not None and not login and node.get('exp') and node['exp'] - 60 <= time.time():
+                self.renew_node(node, node['token']) # ABOUT TO EXPIRE
+            if node['token'] is not None or not self.token or login:
+                break
+            if self.login_node(node).get('success'): # STICKY TOKEN, LOGIN ON THE NODE FIRST
+                break
+            self.hosts.release(node, False)
+        else:
+            raise Exception('Login failed on every node of the host pool!')
+        return f'{node["host"]}{api[len(self.host):]}', node
+    def get_node_headers(self, node: dict, headers: dict) -> dict:
+        '''the headers with the token of the node'''
+        if node is None or not node.get('token') or 'Authorization' not in headers:
+            return headers
+        return {**headers, 'Authorization': f'Bearer {node["token"]}'}
+    def post(self, api: str, headers: dict, **kwargs) -> requests.Response:
+        '''POST outside api_call (the uploads) through the host pool'''
+        _api, node = self.route(api)
+        ok = False
+        try:
+            r = self.get_session().post(
+                _api, headers = self.get_node_headers(node, headers), timeout = self.policy.get_timeout(api), **kwargs
+            )
+            ok = r.status_code < 500
+            return r
+        finally:
+            if node is not None:
+                self.hosts.release(node, ok)
+    def send(self, api: str, data, headers: dict) -> requests.Response:
+        '''POST with the request policy: endpoint timeouts, retries of the idempotent endpoints and hedging'''
+        retries = self.policy.retries if self.policy.match(api, self.policy.idempotent) else 0
+        for attempt in range(retries + 1):
+            _api, node = self.route(api)
+            token = node.get('token') if node is not None else None
+            ok = False
+            try:
+                r = self._hedged_post(api, _api, node, data, headers)
+                if r.status_code == 401 and token and not api.endswith('/dyn_api/login/login') and self.renew_node(node, token): # EXPIRED NODE TOKEN
+                    r = self._hedged_post(api, _api, node, data, headers)
+                ok = r.status_code < 500
+                if r.status_code not in self.policy.retry_status or attempt >= retries:
+                    return r
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+            finally:
+                if node is not None:
+                    self.hosts.release(node, ok)
+            time.sleep(self.policy.get_backoff(attempt))
+        return r
+    def renew_node(self, node: dict, token: str) -> bool:
+        '''login again on the node of the host pool whose token was refused, once for the calls sharing it'''
+        if not self.password or not self.token:
+            return False
+        with self._token_lock:
+            if node.get('token') == token and not self.login_node(node).get('success'):
+                return False
+        return True
+    def renew_token(self, api: str, force: bool = False) -> bool:
+        '''login again when the token is about to expire (or force) and the password is known, with or without
+        a token cache (the host pool renews per node)'''
+        if self.hosts is not None or not self.password or not self.user:
+            return False
+        if api.endswith('/dyn_api/login/login'):
+            return False
+        margin = self.token_cache.margin if self.token_cache is not None else self.token_margin
+        expiring = lambda: self._token_exp and self._token_exp - margin <= time.time()
+        if not force and not expiring():
+            return False
+        with self._token_lock:
+            if force or expiring():
+                self.login(refresh = True)
+        return True
     def api_call(self, api: str, payload: dict):
         '''API CALL'''
+        start, status, request_bytes, response_bytes = time.time(), 'error', 0, 0
         try:
-            headers = {'Accept': '*/*', 'Content-type': 'application/json'}#, 'Accept': 'text/plain'}
-            if self.token:
+            self.renew_token(api)
+            headers = self.get_headers()
+            payload = self.shape_payload(payload)
+            body = self.encode_body(payload, headers)
+            request_bytes = len(body)
+            r = self.send(api, body, headers)
+            if r.status_code == 401 and self.renew_token(api, force = True): # EXPIRED TOKEN
                 headers['Authorization'] = f'Bearer {self.token}'
-            if self.app and isinstance(payload, dict):
-                payload['app'] = self.app
-            if self.lang and isinstance(payload, dict):
-                payload['lang'] = self.lang
-            r = requests.post(
-                url     = api,
-                data    = json.dumps(payload),
-                headers = headers,
-                verify  = False,
-                timeout = 1000
-            )
-            return r.json()
+                r = self.send(api, body, headers)
+            status, response_bytes = r.status_code, len(r.content)
+            return self.decode_body(r)
         except Exception as _err:
             *_, exc_tb = sys.exc_info()
             fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
@@ -82,12 +938,19 @@ class Init:
                 'success': False,
                 'msg': f'API Call Err: {str(_err)}'
             }
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_call(api, status, start, time.time(), request_bytes, response_bytes)
     def set_lang(self, lang: str = 'en'):
         '''LANG'''
         self.lang = lang
         return self
-    def login(self, user: str = None, password: str = None):
-        '''LOGIN'''
+    def set_token_cache(self, cache: TokenCache = None, **kwargs):
+        '''SET THE TOKEN CACHE, login reuses the token until it expires and renews it'''
+        self.token_cache = cache if cache is not None else TokenCache(**kwargs)
+        return self
+    def login(self, user: str = None, password: str = None, refresh: bool = False):
+        '''LOGIN, from the token cache when set unless refresh'''
         if user:
             self.user = user
         if password:
@@ -96,32 +959,131 @@ class Init:
             raise Exception('No user, eather set the CS_USER environmental variable or in .env in the project root!')
         if not self.password:
             raise Exception('No password, eather set the CS_PASS environmental variable or in .env in the project root!')
+        if self.token_cache is not None and self.hosts is None and not refresh:
+            cached = self.token_cache.get(self.host, self.user)
+            if cached:
+                self.token, self._token_exp = cached
+                return self
+        if self.hosts is not None:
+            res = [self.login_node(node) for node in self.hosts.nodes]
+            tokens = [node['token'] for node in self.hosts.nodes if node['token']]
+            if not tokens:
+                raise Exception(res[0].get('message', res[0].get('msg')))
+            self.token = tokens[0]
+            return self
         api = f'{self.host}/dyn_api/login/login'
         payload = {'data': {'username': self.user, 'password': self.password}}
         res = self.api_call(api, payload)
         if res.get('success'):
             self.token = res.get('token')
+            self._token_exp = get_token_exp(self.token)
+            if self.token_cache is not None:
+                self._token_exp = self.token_cache.set(self.host, self.user, self.token)
         else:
             raise Exception(res.get('message'))
         return self
-    def get_apps(self):
-        '''GET APP'''
-        api = f'{self.host}/dyn_api/admin/apps'
-        res = self.api_call(api, {})
+    def login_node(self, node: dict) -> dict:
+        '''LOGIN ON A NODE OF THE HOST POOL, the token stays with the node'''
+        api = f'{self.host}/dyn_api/login/login'
+        with self.hosts.pin(node):
+            res = self.api_call(api, {'data': {'username': self.user, 'password': self.password}})
         if res.get('success'):
-            self.apps = res.get('data')
-            self.set_app(self.apps[0]['app'])
-        else:
-            raise Exception(res.get('message'))
+            node['token'] = res.get('token')
+            node['exp'] = get_token_exp(node['token'])
+        return res
+    def set_cache(self, cache: MetadataCache = None, **kwargs):
+        '''SET THE METADATA CACHE, persisted by host / user when path is True'''
+        if cache is None:
+            if kwargs.get('path') is True:
+                kwargs['path'] = MetadataCache.get_path(self.host, None, self.user)
+            cache = MetadataCache(**kwargs)
+        self.cache = cache
         return self
-    def get_tables(self, table:str = None):
+    def get_etl_cache(self) -> MetadataCache:
+        '''the cache of the ETL / REPORT / BASE reads (ttl etl_cache_ttl, default the cache ttl), None when etl_cache_ttl is 0'''
+        if self.etl_cache_ttl == 0:
+            return None
+        return self.cache
+    def cache_key(self, *parts, app: bool = True) -> str:
+        '''cache key of the host / app / user and the request parts'''
+        _app = self.app.get('app') if isinstance(self.app, dict) and app else None
+        return json.dumps([self.host, _app, self.user, *parts], default = str)
+    def invalidate(self, table: str = None):
+        '''drop the cached metadata and reads from the table, or all of them'''
+        if self.cache is not None:
+            self.cache.invalidate(table)
+        if self.read_cache is not None:
+            with self._inflight_lock:
+                self._read_generation += 1
+            self.read_cache.invalidate(table)
+        return self
+    def set_read_cache(self, cache: MetadataCache = None, **kwargs):
+        '''SET THE READ CACHE, identical reads are answered from it (default ttl 60s, 1024 entries)'''
+        if cache is None:
+            kwargs = {'ttl': 60, 'max_size': 1024, **kwargs}
+            cache = MetadataCache(**kwargs)
+        self.read_cache = cache
+        return self
+    def cached_read(self, params: dict, refresh: bool = False) -> dict:
+        '''crud/read through the read cache, concurrent identical reads share one call'''
+        api = f'{self.host}/dyn_api/crud/read'
+        if self.read_cache is None:
+            return self.api_call(api, {'data': params})
+        key = self.cache_key('read', self.lang, json.dumps(params, sort_keys = True, default = str))
+        res = self.read_cache.get(key) if not refresh else None
+        if res is not None:
+            return res
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                generation = self._read_generation
+        if not owner:
+            return copy.deepcopy(future.result())
+        try:
+            res = self.api_call(api, {'data': params})
+            tables = params.get('table') if isinstance(params.get('table'), list) else [params.get('table')]
+            tables = [t for t in tables + list(params.get('tables') or []) if t]
+            with self._inflight_lock:
+                if res.get('success') and generation == self._read_generation: # NO WRITE SINCE THE READ STARTED
+                    self.read_cache.set(key, res, tables)
+            future.set_result(res)
+        except BaseException as _err:
+            future.set_exception(_err)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return copy.deepcopy(res)
+    def get_apps(self, refresh: bool = False):
+        '''GET APP'''
+        key = self.cache_key('apps', app = False)
+        apps = self.cache.get(key) if self.cache is not None and not refresh else None
+        if apps is None:
+            api = f'{self.host}/dyn_api/admin/apps'
+            res = self.api_call(api, {})
+            if not res.get('success'):
+                raise Exception(res.get('message'))
+            apps = res.get('data')
+            if self.cache is not None:
+                self.cache.set(key, apps, ['app'])
+        self.apps = apps
+        self.set_app(self.apps[0]['app'])
+        return self
+    def get_tables(self, table:str = None, refresh: bool = False):
         '''GET TABLES'''
-        api = f'{self.host}/dyn_api/admin/tables'
-        res = self.api_call(api, {'table': table})
-        if res.get('success'):
-            self.tables = res.get('data')
-        else:
-            raise Exception(res.get('message'))
+        key = self.cache_key('tables', table)
+        tables = self.cache.get(key) if self.cache is not None and not refresh else None
+        if tables is None:
+            api = f'{self.host}/dyn_api/admin/tables'
+            res = self.api_call(api, {'table': table})
+            if not res.get('success'):
+                raise Exception(res.get('message'))
+            tables = res.get('data')
+            if self.cache is not None:
+                self.cache.set(key, tables, ['table', 'column'])
+        self.tables = tables
         return self
     def set_app(self, app: str):
         '''SET APP'''
@@ -139,12 +1101,82 @@ class Init:
         if params:
             self._r_params = ReadParams(**params)
         return self
-    def read(self, payload: ReadParams = None):
-        '''READ'''
+    def read(self, payload: ReadParams = None, frame: str = None, refresh: bool = False):
+        '''READ, as a DataFrame / Table when frame is "pandas" / "arrow"'''
         if payload:
             self._r_params = payload
+        params = payload or self._r_params # THE PAYLOAD, NOT THE SHARED STATE, WHEN GIVEN
+        if frame:
+            return self.read_frame(params, kind = frame)
+        return self.cached_read(params.get_dict(), refresh)
+    def read_frame(self, payload: ReadParams = None, kind: str = 'pandas', page_size: int = None, types: dict = None):
+        '''READ AS A pandas DataFrame OR pyarrow Table (kind = "arrow")
+
+        The columns are the ReadParams fields (or the keys of the first page)
+        built column-wise, with the ISO dates parsed per column. With a
+        positive limit it's a single read, with limit -1 or a page_size the
+        table is read page by page and every page converted as it arrives.
+        '''
+        if isinstance(payload, dict):
+            payload = ReadParams(**payload)
+        params = payload if payload else self._r_params
+        if not params:
+            raise Exception('No read parameters, use .read_params first!')
+        if params.limit and params.limit > 0 and not page_size:
+            pages = iter([self.read(params).get('data') or []])
+        else:
+            pages = self.read_iter(params, page_size = page_size or 10000, chunked = True)
+        fields, frames = params.fields, []
+        for page in pages:
+            columns = rows_to_columns(page, fields)
+            if fields is None or types is None:
+                fields = list(columns)
+                types = infer_types(columns, types)
+            frames.append(columns_to_frame(columns, kind, types))
+        if not frames:
+            return columns_to_frame({f: [] for f in (fields or [])}, kind, types)
+        return frames[0] if len(frames) == 1 else concat_frames(frames, kind)
+    def read_iter(self, payload: ReadParams = None, page_size: int = None, chunked: bool = False, prefetch: bool = True):
+        '''ITERATE READ: walk offset / limit in pages, yield rows (or pages when chunked)
+
+        The page size is page_size or the ReadParams limit (1000 when -1), and
+        the next page is fetched in the background while the current one is consumed.
+        '''
+        if isinstance(payload, dict):
+            payload = ReadParams(**payload)
+        params = payload if payload else self._r_params
+        if not params:
+            raise Exception('No read parameters, use .read_params first!')
+        if isinstance(params.table, list):
+            raise Exception('read_iter works over a single table!')
+        if not page_size:
+            page_size = params.limit if params.limit and params.limit > 0 else 1000
         api = f'{self.host}/dyn_api/crud/read'
-        return self.api_call(api, {'data': self._r_params.get_dict()})
+        def _fetch(offset):
+            _params = {**params.get_dict(), 'limit': page_size, 'offset': offset}
+            res = self.api_call(api, {'data': _params})
+            if not res.get('success'):
+                raise Exception(res.get('msg', res.get('message')))
+            return res.get('data') or []
+        executor = ThreadPoolExecutor(max_workers = 1) if prefetch else None
+        try:
+            offset = params.offset or 0
+            page = _fetch(offset)
+            while page:
+                offset += page_size
+                _next = None
+                if len(page) >= page_size and executor:
+                    _next = executor.submit(_fetch, offset)
+                if chunked:
+                    yield page
+                else:
+                    yield from page
+                if len(page) < page_size:
+                    break
+                page = _next.result() if _next else _fetch(offset)
+        finally:
+            if executor:
+                executor.shutdown(wait = False)
     def create_params(self, params):
         '''return create parameters'''
         if params:
@@ -154,56 +1186,268 @@ class Init:
         '''CREATE'''
         if payload:
             self._c_params = payload
+        params = payload or self._c_params # THE PAYLOAD, NOT THE SHARED STATE, WHEN GIVEN
         api = f'{self.host}/dyn_api/crud/create'
-        return self.api_call(api, {'data': self._c_params.get_dict()})
+        res = self.api_call(api, {'data': params.get_dict()})
+        self.invalidate(params.table)
+        return res
     def update(self, payload: CreateParams = None):
         '''UPDATE'''
         if payload:
             self._c_params = payload
+        params = payload or self._c_params # THE PAYLOAD, NOT THE SHARED STATE, WHEN GIVEN
         api = f'{self.host}/dyn_api/crud/update'
-        return self.api_call(api, {'data': self._c_params.get_dict()})
+        res = self.api_call(api, {'data': params.get_dict()})
+        self.invalidate(params.table)
+        return res
     def delete(self, payload: CreateParams = None):
         '''DELETE'''
         if payload:
             self._c_params = payload
+        params = payload or self._c_params # THE PAYLOAD, NOT THE SHARED STATE, WHEN GIVEN
         api = f'{self.host}/dyn_api/crud/delete'
-        return self.api_call(api, {'data': self._c_params.get_dict()})
-    def query(self, payload: CreateParams = None):
-        '''QUERY'''
+        res = self.api_call(api, {'data': params.get_dict()})
+        self.invalidate(params.table)
+        return res
+    def iter_chunks(self, rows, chunk_size: int = 1000, max_bytes: int = None):
+        '''split any iterable of rows in lists of at most chunk_size rows / max_bytes of json'''
+        chunk, size = [], 0
+        for row in rows:
+            row_size = len(json.dumps(row, default = json_default)) if max_bytes else 0
+            if chunk and (len(chunk) >= chunk_size or (max_bytes and size + row_size > max_bytes)):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(row)
+            size += row_size
+        if chunk:
+            yield chunk
+    def _bulk_chunk(self, action: str, table: str, chunk: list, first: int, database: str = None, verbose: bool = False) -> dict:
+        '''send one chunk, returns its compact summary'''
+        api = f'{self.host}/dyn_api/crud/{action}'
+        params = CreateParams(table = table, data = chunk, database = database)
+        res = self.api_call(api, {'data': params.get_dict()})
+        summary = {
+            'first': first,
+            'rows': len(chunk),
+            'success': bool(res.get('success')),
+            'msg': res.get('msg', res.get('message')),
+            'inserted': [],
+            'failed': []
+        }
+        rows = res.get('data') if isinstance(res.get('data'), dict) else {}
+        results = {}
+        for key, row in rows.items():
+            _match = re.search(r'_row_exec_(\d+)$', key)
+            if _match and isinstance(row, dict):
+                results[int(_match.group(1)) - 1] = row
+        for i, row in enumerate(chunk):
+            _res = results.get(i)
+            if _res is None:
+                if not summary['success']:
+                    summary['failed'].append({'row': first + i, 'msg': summary['msg'], 'data': row})
+            elif _res.get('success'):
+                if _res.get('inserted_primary_key') is not None:
+                    summary['inserted'].append(_res.get('inserted_primary_key'))
+            else:
+                summary['failed'].append({'row': first + i, 'msg': _res.get('msg'), 'data': row})
+        if verbose:
+            summary['response'] = res
+        return summary
+    def bulk(self, action: str, table: str, rows, chunk_size: int = 1000, max_bytes: int = None, max_workers: int = 4, database: str = None, verbose: bool = False) -> dict:
+        '''BULK CREATE / UPDATE / DELETE
+
+        The rows (any iterable, consumed lazily) are sent in chunks of at most
+        chunk_size rows / max_bytes, max_workers chunks in flight. Returns the
+        chunk summaries with the inserted keys and the failed rows with their
+        reason. The per row echo of the server is kept only when verbose.
+        '''
+        if action not in ['create', 'update', 'delete']:
+            raise Exception(f'Unknown bulk action {action}!')
+        chunks, first = [], 0
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            running = set()
+            for chunk in self.iter_chunks(rows, chunk_size, max_bytes):
+                if len(running) >= max(1, max_workers):
+                    done, running = wait(running, return_when = FIRST_COMPLETED)
+                future = executor.submit(self._bulk_chunk, action, table, chunk, first, database, verbose)
+                chunks.append(future)
+                running.add(future)
+                first += len(chunk)
+            chunks = [future.result() for future in chunks]
+        self.invalidate(table)
+        return {
+            'success': all(chunk['success'] and not chunk['failed'] for chunk in chunks),
+            'rows': first,
+            'inserted': [key for chunk in chunks for key in chunk['inserted']],
+            'failed': [row for chunk in chunks for row in chunk['failed']],
+            'chunks': chunks
+        }
+    def bulk_create(self, table: str, rows, **kwargs) -> dict:
+        '''BULK CREATE'''
+        return self.bulk('create', table, rows, **kwargs)
+    def bulk_update(self, table: str, rows, **kwargs) -> dict:
+        '''BULK UPDATE'''
+        return self.bulk('update', table, rows, **kwargs)
+    def bulk_delete(self, table: str, rows, **kwargs) -> dict:
+        '''BULK DELETE'''
+        return self.bulk('delete', table, rows, **kwargs)
+    def query(self, payload: CreateParams = None, frame: str = None, types: dict = None):
+        '''QUERY, as a DataFrame / Table when frame is "pandas" / "arrow"'''
         if not payload:
             raise Exception('No PAYLOAD!')
         api = f'{self.host}/dyn_api/crud/query'
-        return self.api_call(api, {'data': payload})
+        res = self.api_call(api, {'data': payload})
+        if not frame:
+            return res
+        if not res.get('success'):
+            raise Exception(res.get('msg', res.get('message')))
+        columns = rows_to_columns(res.get('data') or [])
+        return columns_to_frame(columns, frame, infer_types(columns, types))
     def etl(self, action, payload):
         '''GENERIC ETL'''
         if not payload:
             raise Exception('No PAYLOAD!')
         api = f'{self.host}/dyn_api/etl/{action}'
         return self.api_call(api, {'data': payload})
-    def upload(self, payload: dict, file_path:str):
-        '''UPLOAD FILE'''
-        post_files = {
-            "file": open(file_path, "rb"),
-        }
-        api = f'{self.host}/upload'
-        headers = {
+    def get_upload_headers(self) -> dict:
+        '''return the upload headers with the Bearer token'''
+        return {
             "Accept": "*/*",
             "enctype": "multipart/form-data",
             "Authorization": f"Bearer {self.token}",
             #"Content-Type": "multipart/form-data; boundary=kljmyvW1ndjXaOEAg4vPm6RBUqO6MC5A" 
         }
-        res = requests.request(
-            "POST",
-            api,
-            data = payload,
-            files = post_files,
-            headers = headers,
-            timeout= 1000
-        )
+    def upload(self, payload: dict, file_path:str):
+        '''UPLOAD FILE'''
+        api = f'{self.host}/upload'
+        with open(file_path, "rb") as _file:
+            res = self.post(
+                api,
+                self.get_upload_headers(),
+                data = payload,
+                files = {"file": _file}
+            )
         return res.json()
+    def file_checksum(self, file_path: str, block_size: int = 1024 * 1024) -> str:
+        '''sha256 of the file, read in blocks'''
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as _file:
+            for block in iter(lambda: _file.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    def upload_stream(self, payload: dict, file_path: str, chunk_size: int = 8 * 1024 * 1024, resume: bool = True, checksum: bool = True, retries: int = 3):
+        '''UPLOAD FILE IN CHUNKS
+
+        The file is sent in chunk_size parts (upload_id, chunk, chunks, offset,
+        size, sha256 and filename go with each one) and never loaded whole. The
+        acknowledged chunks are kept in a manifest so a failed upload resumes
+        where it stopped, and with checksum the server is asked first (check,
+        sha256, size) and the upload skipped when it answers exists. With a
+        host pool all the parts go to the same node. The upload_id (and the
+        manifest) is of the file, the payload and the host, the same upload
+        running on another thread is waited for instead of sent twice. The
+        answer to the last chunk must confirm the assembly (assembled), else
+        it raises, a server without chunked uploads keeps only the last part.
+        '''
+        if self.hosts is not None and getattr(self.hosts.local, 'node', None) is None:
+            with self.hosts.pin():
+                return self.upload_stream(payload, file_path, chunk_size, resume, checksum, retries)
+        payload = dict(payload or {})
+        api = f'{self.host}/upload'
+        size = os.path.getsize(file_path)
+        sha256 = self.file_checksum(file_path)
+        meta = {'sha256': sha256, 'size': size, 'filename': os.path.basename(file_path)}
+        if checksum:
+            res = self.post(api, self.get_upload_headers(), data = {**payload, **meta, 'check': True})
+            try:
+                res = res.json()
+            except ValueError:
+                res = {}
+            if res.get('exists'):
+                return {**res, 'skipped': True}
+        node = getattr(self.hosts.local, 'node', None) if self.hosts is not None else None
+        host = node['host'] if node is not None else self.host
+        upload_id = hashlib.sha256(
+            json.dumps([sha256, host, payload], sort_keys = True, default = str).encode('utf-8')
+        ).hexdigest()[:32]
+        manifest_path = os.path.join(get_cache_dir(), 'uploads', f'{upload_id}.json')
+        with self._inflight_lock:
+            future = self._inflight.get(manifest_path)
+            owner = future is None
+            if owner:
+                future = self._inflight[manifest_path] = Future()
+        if not owner: # THE SAME UPLOAD IS RUNNING ON ANOTHER THREAD
+            return copy.deepcopy(future.result())
+        try:
+            res = self.upload_chunks(api, payload, meta, file_path, upload_id, manifest_path, chunk_size, resume, retries)
+            future.set_result(res)
+        except BaseException as _err:
+            future.set_exception(_err)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(manifest_path, None)
+        return res
+    def upload_chunks(self, api: str, payload: dict, meta: dict, file_path: str, upload_id: str, manifest_path: str, chunk_size: int, resume: bool, retries: int):
+        '''send the chunks of the file not in the manifest, retried with the policy backoff'''
+        chunks = max(1, -(-meta['size'] // chunk_size))
+        done = {}
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding = 'utf-8') as _file:
+                manifest = json.load(_file)
+            if manifest.get('chunk_size') == chunk_size:
+                done = manifest.get('done', {})
+        os.makedirs(os.path.dirname(manifest_path), exist_ok = True)
+        res = None
+        with open(file_path, 'rb') as _file:
+            for chunk in range(chunks):
+                if str(chunk) in done:
+                    res = done[str(chunk)]
+                    continue
+                _file.seek(chunk * chunk_size)
+                data = _file.read(chunk_size)
+                form = {
+                    **payload, **meta, 'upload_id': upload_id,
+                    'chunk': chunk, 'chunks': chunks, 'offset': chunk * chunk_size
+                }
+                for attempt in range(retries + 1):
+                    try:
+                        r = self.post(
+                            api,
+                            self.get_upload_headers(),
+                            data = form,
+                            files = {'file': (meta['filename'], data)}
+                        )
+                        res = r.json()
+                        if res.get('success') is False:
+                            raise Exception(res.get('msg', res.get('message')))
+                        break
+                    except Exception as _err:
+                        if attempt >= retries:
+                            raise Exception(f'Upload of {file_path} failed at chunk {chunk}: {str(_err)}') from _err
+                        time.sleep(self.policy.get_backoff(attempt))
+                done[str(chunk)] = res
+                with open(manifest_path, 'w', encoding = 'utf-8') as _manifest:
+                    json.dump({'file_path': file_path, 'chunk_size': chunk_size, 'done': done}, _manifest, default = str)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        if not res.get('assembled'):
+            raise Exception(f'Upload of {file_path} not assembled by the server, it answered: {res.get("msg", res.get("message", res))}')
+        return res
+    def upload_many(self, payload: dict, file_paths: list, max_workers: int = 4, stream: bool = False, **kwargs) -> dict:
+        '''UPLOAD FILES CONCURRENTLY with upload, or upload_stream (kwargs) when stream, returns {file_path: response}'''
+        def _upload(file_path):
+            try:
+                if stream:
+                    return self.upload_stream(payload, file_path, **kwargs)
+                return self.upload(payload, file_path)
+            except Exception as _err:
+                return {'success': False, 'msg': str(_err)}
+        with ThreadPoolExecutor(max_workers = max(1, max_workers)) as executor:
+            return dict(zip(file_paths, executor.map(_upload, file_paths)))
 class CentralSet():
     """Central Set Python CLI"""
-    def __init__(self, host: str = None, user: str = None, password: str = None):
+    def __init__(self, host = None, user: str = None, password: str = None):
         self.host = host
         # self.port = port
         self.user = user
@@ -223,7 +1467,485 @@ class CentralSet():
             init.password = password
         elif self.password:
             init.password = self.password
+        if isinstance(init.host, (list, tuple, dict)):
+            init.set_hosts(init.host)
         return init
+class LogSink():
+    '''Buffered log sink, a background thread writes the logs in batches
+
+    The batch is written when it reaches batch_size logs or every
+    flush_interval seconds, and write blocks when max_queue logs are
+    waiting (back-pressure). The logs are written with the run (begin) they
+    belong to and read(run) returns only those, the queued logs are written
+    at exit. Subclasses implement write_batch and read.
+    '''
+    def __init__(self, batch_size: int = 100, flush_interval: float = 5, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.runs = {}
+        self._queue = queue.Queue(maxsize = max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+    def begin(self) -> str:
+        '''start a run, returns its id'''
+        run = uuid.uuid4().hex
+        with self._lock:
+            self.runs[run] = self.new_run()
+        return run
+    def new_run(self):
+        '''what the sink keeps of a run to read its logs back'''
+        return None
+    def write(self, logs: list, run: str = None):
+        '''queue the logs of the run to be written'''
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target = self._worker, daemon = True)
+                    self._thread.start()
+                    atexit.register(self.close) # THE DAEMON THREAD DIES WITH THE PROCESS
+        for log in logs:
+            self._queue.put(('log', run, log))
+        return self
+    def _worker(self):
+        batch, runs, first = [], [], None
+        while True:
+            timeout = self.flush_interval - (time.time() - first) if first else self.flush_interval
+            try:
+                kind, *item = self._queue.get(timeout = max(0.01, timeout))
+            except queue.Empty:
+                kind, item = None, None
+            if kind == 'log':
+                runs.append(item[0])
+                batch.append(item[1])
+                first = first or time.time()
+            due = first and time.time() - first >= self.flush_interval
+            if batch and (kind != 'log' or len(batch) >= self.batch_size or due):
+                try:
+                    self.write_batch(batch, runs)
+                except Exception as _err:
+                    print('LOG SINK ERR: ', str(_err))
+                batch, runs, first = [], [], None
+            if kind in ['flush', 'stop']:
+                item[0].set()
+                if kind == 'stop':
+                    break
+    def _signal(self, action: str):
+        if self._thread is None:
+            return self
+        event = threading.Event()
+        self._queue.put((action, event))
+        event.wait()
+        if action == 'stop':
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.close)
+        return self
+    def flush(self):
+        '''wait for the queued logs to be written'''
+        return self._signal('flush')
+    def close(self):
+        '''write the queued logs and stop the background thread'''
+        return self._signal('stop')
+    def write_batch(self, batch: list, runs: list):
+        '''write a batch of logs, runs[i] is the run of batch[i]'''
+        raise NotImplementedError
+    def read(self, run: str = None) -> list:
+        '''return the logs written in the run, all of them without'''
+        raise NotImplementedError
+class APILogSink(LogSink):
+    '''Log sink creating the logs in the etl_report_base_log table in batches
+
+    A run reads back the rows created for it: the ones of its base / ref
+    started since its first log, by the inserted keys when the server
+    returns them.
+    '''
+    def __init__(self, cs: Init, table: str = 'etl_report_base_log', **kwargs):
+        super().__init__(**kwargs)
+        self.cs = cs
+        self.table = table
+        self.written = set()
+    def new_run(self):
+        return {'since': None, 'written': set(), 'keys': set()}
+    def write_batch(self, batch: list, runs: list):
+        for run in dict.fromkeys(runs): # ONE CREATE PER RUN, THE INSERTED KEYS ARE THE RUN'S
+            logs = [log for log, _run in zip(batch, runs) if _run == run]
+            written = {(log.get('etl_report_base_id'), log.get('ref')) for log in logs}
+            since = min((str(log.get('start')) for log in logs if log.get('start')), default = None)
+            res = self.cs.bulk_create(self.table, logs, chunk_size = self.batch_size)
+            with self._lock:
+                self.written.update(written)
+                if run in self.runs:
+                    _run = self.runs[run]
+                    _run['written'].update(written)
+                    _run['keys'].update(res.get('inserted') or [])
+                    if since and (_run['since'] is None or since < _run['since']):
+                        _run['since'] = since
+            if not res.get('success'):
+                print('LOG SINK ERR: ', res.get('failed')[:1] or res.get('chunks')[:1])
+    def read(self, run: str = None) -> list:
+        self.flush()
+        _run = self.runs.get(run) if run is not None else None
+        if run is not None and _run is None:
+            return []
+        logs = []
+        for etl_report_base_id, ref in sorted(_run['written'] if _run else self.written, key = str):
+            _params = {
+                'table': self.table,
+                'limit': 1000,
+                'join': 'none',
+                'filters': [
+                    {'field': 'etl_report_base_id', 'cond': '=', 'value': etl_report_base_id},
+                    {'field': 'ref', 'cond': '=', 'value': ref}
+                ]
+            }
+            if _run and _run['since']:
+                _params['filters'].append({'field': 'start', 'cond': '>=', 'value': _run['since']})
+            logs.extend(self.cs.read_iter(_params))
+        if _run and _run['keys']:
+            logs = [log for log in logs if log.get(f'{self.table}_id') in _run['keys']]
+        return logs
+class NDJSONLogSink(LogSink):
+    '''Log sink appending the logs as json lines to a local file, the offsets of the lines of each run are kept'''
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+    def new_run(self):
+        return []
+    def write_batch(self, batch: list, runs: list):
+        with open(self.path, 'ab') as _file:
+            for log, run in zip(batch, runs):
+                if run in self.runs:
+                    self.runs[run].append(_file.tell())
+                _file.write((json.dumps(log, default = json_default) + '\n').encode('utf-8'))
+    def read(self, run: str = None) -> list:
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'rb') as _file:
+            if run is None:
+                return [json.loads(line) for line in _file if line.strip()]
+            logs = []
+            for offset in list(self.runs.get(run) or []):
+                _file.seek(offset)
+                logs.append(json.loads(_file.readline()))
+            return logs
+class SQLiteLogSink(LogSink):
+    '''Log sink inserting the logs in a local SQLite table'''
+    def __init__(self, path: str, table: str = 'etl_report_base_log', **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.table = table
+        self._conn = sqlite3.connect(path, check_same_thread = False)
+        self._conn_lock = threading.Lock()
+        with self._conn_lock, self._conn:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'log_id INTEGER PRIMARY KEY, type TEXT, ref TEXT, name TEXT, success INTEGER, log TEXT, run_id TEXT)'
+            )
+            columns = [row[1] for row in self._conn.execute(f'PRAGMA table_info({self.table})')]
+            if 'run_id' not in columns:
+                self._conn.execute(f'ALTER TABLE {self.table} ADD COLUMN run_id TEXT')
+    def write_batch(self, batch: list, runs: list):
+        rows = [
+            (log.get('type'), log.get('ref'), log.get('name'), log.get('success'), json.dumps(log, default = json_default), run)
+            for log, run in zip(batch, runs)
+        ]
+        with self._conn_lock, self._conn:
+            self._conn.executemany(
+                f'INSERT INTO {self.table} (type, ref, name, success, log, run_id) VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+    def read(self, run: str = None) -> list:
+        self.flush()
+        with self._conn_lock:
+            if run is None:
+                rows = self._conn.execute(f'SELECT log FROM {self.table} ORDER BY log_id').fetchall()
+            else:
+                rows = self._conn.execute(f'SELECT log FROM {self.table} WHERE run_id = ? ORDER BY log_id', (run, )).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    def close(self):
+        super().close()
+        with self._conn_lock:
+            self._conn.close()
+        return self
+class CheckpointStore():
+    '''Last run of each item, keyed by (etl_report_base_id, ref, action, name)
+
+    A checkpoint is {"success", "start", "end"}, resume runs skip the items
+    whose checkpoint succeeded and whose upstream did not run since.
+    '''
+    def __init__(self):
+        self.checkpoints = {}
+        self.lock = threading.RLock()
+    @staticmethod
+    def get_key(etl_report_base_id, ref, action: str, name) -> str:
+        return json.dumps([etl_report_base_id, ref, str(action).lower(), name], default = str)
+    def load(self, etl_report_base_id, refs: list):
+        '''get the checkpoints of the base for the refs ready'''
+        return self
+    def get(self, etl_report_base_id, ref, action: str, name) -> dict:
+        '''the checkpoint of the item, None if it never ran'''
+        with self.lock:
+            return self.checkpoints.get(self.get_key(etl_report_base_id, ref, action, name))
+    def set(self, etl_report_base_id, ref, action: str, name, checkpoint: dict):
+        '''record the last run of the item, in memory until save'''
+        with self.lock:
+            self.checkpoints[self.get_key(etl_report_base_id, ref, action, name)] = checkpoint
+        return self
+    def clear(self, etl_report_base_id = None, ref = None):
+        '''drop the checkpoints of the base / ref, or all of them'''
+        with self.lock:
+            for key in list(self.checkpoints):
+                _base, _ref, *_ = json.loads(key)
+                if etl_report_base_id is not None and str(_base) != str(etl_report_base_id):
+                    continue
+                if ref is not None and _ref != ref:
+                    continue
+                del self.checkpoints[key]
+            self.save()
+        return self
+    def save(self):
+        return self
+class FileCheckpointStore(CheckpointStore):
+    '''Checkpoints in a local json file, by default checkpoints.json in the cache folder'''
+    def __init__(self, path: str = None):
+        super().__init__()
+        self.path = path or os.path.join(get_cache_dir(), 'checkpoints.json')
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding = 'utf-8') as _file:
+                self.checkpoints = json.load(_file)
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding = 'utf-8') as _file:
+                json.dump(self.checkpoints, _file, default = str)
+            os.replace(tmp, self.path)
+        return self
+class LogCheckpointStore(CheckpointStore):
+    '''Checkpoints from the logs saved in the etl_report_base_log table
+
+    The last log of each item is its checkpoint, the runs of this process are
+    kept in memory (they reach the table through save_logs or an APILogSink).
+    '''
+    def __init__(self, cs: Init, table: str = 'etl_report_base_log'):
+        super().__init__()
+        self.cs = cs
+        self.table = table
+        self.loaded = set()
+    def load(self, etl_report_base_id, refs: list):
+        for ref in refs:
+            if (etl_report_base_id, ref) in self.loaded:
+                continue
+            _params = {
+                'table': self.table,
+                'limit': 1000,
+                'join': 'none',
+                'filters': [
+                    {'field': 'etl_report_base_id', 'cond': '=', 'value': etl_report_base_id},
+                    {'field': 'ref', 'cond': '=', 'value': ref}
+                ]
+            }
+            last = {}
+            for log in self.cs.read_iter(_params):
+                if str(log.get('msg') or '').startswith('Skipped,') or not log.get('type'):
+                    continue
+                key = self.get_key(etl_report_base_id, ref, log.get('type'), log.get('name'))
+                if key not in last or str(log.get('end')) > str(last[key].get('end')):
+                    last[key] = {'success': bool(log.get('success')), 'start': log.get('start'), 'end': log.get('end')}
+            with self.lock:
+                for key, checkpoint in last.items():
+                    self.checkpoints.setdefault(key, checkpoint)
+                self.loaded.add((etl_report_base_id, ref))
+        return self
+class ETLData(MutableMapping):
+    '''Data of an ETLReportBase, each table read on its first access
+
+    The tables are read by etl_report_base_id, several in one call with
+    load, and with only the fields of ETLReportBase.get_table_fields when
+    set. etl_report_base_log holds the logs of this run, the logs saved for
+    the ref are read page by page with iter_saved_logs. The data of a
+    copy_base reads its tables from the data it was copied from.
+    '''
+    log_table: str = 'etl_report_base_log'
+    def __init__(self, etl: ETLReportBase, etl_report_base_id, refresh: bool = False, parent: ETLData = None):
+        self.etl = etl
+        self.etl_report_base_id = etl_report_base_id
+        self.refresh = refresh
+        self.parent = parent
+        self.tables = {}
+        self.lock = threading.RLock()
+    def __getitem__(self, table: str):
+        if table not in self.tables and table in self:
+            self.load([table])
+        return self.tables[table]
+    def __setitem__(self, table: str, value):
+        with self.lock:
+            self.tables[table] = value
+    def __delitem__(self, table: str):
+        with self.lock:
+            del self.tables[table]
+    def __contains__(self, table) -> bool:
+        return table in self.tables or table in self.etl.tables
+    def __iter__(self):
+        return iter(list(dict.fromkeys([*self.etl.tables, *self.tables])))
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+    def __repr__(self):
+        return f'ETLData({self.etl_report_base_id}, read: {list(self.tables)})'
+    def to_dict(self) -> dict:
+        '''every table, as a dict'''
+        return dict(self.items())
+    def load(self, tables: list):
+        '''read the tables not read yet, the ones without a field selection in one call'''
+        with self.lock:
+            missing = [table for table in dict.fromkeys(tables) if table not in self.tables and table in self]
+            if self.log_table in missing: # THE LOGS OF THIS RUN
+                self.tables[self.log_table] = {'data': []}
+                missing.remove(self.log_table)
+            if not missing:
+                return self
+            if self.parent is not None:
+                self.parent.load(missing)
+                for table in missing:
+                    self.tables[table] = copy.deepcopy(self.parent[table])
+                return self
+            together = [table for table in missing if not self.etl.get_table_fields(table)]
+            if together:
+                self.tables.update(self.read(together))
+            for table in missing:
+                if table not in together:
+                    self.tables.update(self.read([table], self.etl.get_table_fields(table)))
+        return self
+    def read(self, tables: list, fields: list = None) -> dict:
+        '''{table: {"data": rows}} of the base, from the Init cache when set'''
+        _params = {
+            'table': tables if not fields else tables[0],
+            'limit': -1,
+            'join': 'none',
+            'fields': fields,
+            'filters': [{'field': 'etl_report_base_id', 'cond': '=', 'value': self.etl_report_base_id}]
+        }
+        cs = self.etl.cs
+        key = cs.cache_key('data', _params)
+        cache = cs.get_etl_cache()
+        data = cache.get(key) if cache is not None and not self.refresh else None
+        if data is None:
+            res = cs.read(ReadParams(**_params))
+            if not res.get('success', True) or res.get('data') is None:
+                raise Exception(res.get('msg', res.get('message')))
+            data = {tables[0]: {'data': res.get('data')}} if fields else res.get('data')
+            data = {table: data.get(table) or {'data': []} for table in tables}
+            if cache is not None:
+                cache.set(key, data, tables, ttl = cs.etl_cache_ttl)
+        return data
+    def iter_saved_logs(self, page_size: int = 1000):
+        '''the logs saved in the log table for the ref, read page by page'''
+        _params = {
+            'table': self.log_table,
+            'limit': page_size,
+            'join': 'none',
+            'filters': [
+                {'field': 'etl_report_base_id', 'cond': '=', 'value': self.etl_report_base_id},
+                {'field': 'ref', 'cond': 'LIKE', 'value': self.etl.ref.strftime('%Y-%m-%d')}
+            ]
+        }
+        yield from self.etl.cs.read_iter(_params, page_size = page_size)
+class DurationStore():
+    '''Item durations of the past runs, from the etl_report_base_log table
+
+    The successful runs of the last `days` days are read once per base and
+    kept in durations.json in the cache folder for `ttl` seconds, the runs of
+    this process are added as they finish and saved with save. The expected
+    duration of an item is the median of its last `history` runs.
+    '''
+    def __init__(self, cs: Init, path: str = None, table: str = 'etl_report_base_log', days: int = 30, history: int = 10, ttl: float = 86400):
+        self.cs = cs
+        self.table = table
+        self.days = days
+        self.history = history
+        self.ttl = ttl
+        self.cache = MetadataCache(max_size = 1024, ttl = 0, path = path or os.path.join(get_cache_dir(), 'durations.json'))
+        self.durations = {}
+        self.dirty = set()
+        self.lock = threading.RLock()
+    def get_key(self, etl_report_base_id) -> str:
+        return json.dumps([self.cs.host, etl_report_base_id], default = str)
+    @staticmethod
+    def get_duration(log: dict):
+        '''seconds the logged run took, None when unknown'''
+        if log.get('duration') is not None:
+            return float(log.get('duration'))
+        try:
+            return (parser.parse(str(log.get('end'))) - parser.parse(str(log.get('start')))).total_seconds()
+        except (ValueError, TypeError, OverflowError):
+            return None
+    @staticmethod
+    def median(values: list) -> float:
+        values = sorted(values)
+        mid = len(values) // 2
+        return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+    def read(self, etl_report_base_id) -> dict:
+        '''the last durations of each "action/name" from the log table'''
+        since = datetime.datetime.now() - datetime.timedelta(days = self.days)
+        _params = {
+            'table': self.table,
+            'limit': 1000,
+            'join': 'none',
+            'filters': [
+                {'field': 'etl_report_base_id', 'cond': '=', 'value': etl_report_base_id},
+                {'field': 'start', 'cond': '>=', 'value': since.isoformat()}
+            ]
+        }
+        runs = {}
+        for log in self.cs.read_iter(_params):
+            if not log.get('type') or not log.get('success') or str(log.get('msg') or '').startswith('Skipped,'):
+                continue
+            duration = self.get_duration(log)
+            if duration is None or duration < 0:
+                continue
+            key = f'{str(log.get("type")).lower()}/{log.get("name")}'
+            runs.setdefault(key, {})[str(log.get('start'))] = duration # THE LOGS OF A MULTILINE ITEM SHARE THE START
+        return {key: [runs[key][start] for start in sorted(runs[key])][-self.history:] for key in runs}
+    def load(self, etl_report_base_id, refresh: bool = False):
+        '''get the durations of the base, from the cache when read less than ttl ago'''
+        key = self.get_key(etl_report_base_id)
+        with self.lock:
+            if key in self.durations and not refresh:
+                return self
+        entry = self.cache.get(key) if not refresh else None
+        if entry is None or entry.get('read_at', 0) < time.time() - self.ttl:
+            entry = {'read_at': time.time(), 'items': self.read(etl_report_base_id)}
+            self.cache.set(key, entry, [self.table])
+        with self.lock:
+            self.durations.setdefault(key, entry)
+        return self
+    def record(self, etl_report_base_id, action: str, name, duration: float):
+        '''add a run of the item to a loaded base, in memory until save'''
+        key = self.get_key(etl_report_base_id)
+        with self.lock:
+            if key not in self.durations:
+                return self
+            runs = self.durations[key]['items'].setdefault(f'{str(action).lower()}/{name}', [])
+            runs.append(duration)
+            del runs[:-self.history]
+            self.dirty.add(key)
+        return self
+    def save(self):
+        '''persist the bases with new runs'''
+        with self.lock:
+            for key in self.dirty:
+                self.cache.set(key, self.durations[key], [self.table])
+            self.dirty.clear()
+        return self
+    def get_expected(self, etl_report_base_id, action: str, name, fallback: bool = True):
+        '''median of the item runs, else (with fallback) the median of the items of the action, None when unknown'''
+        action = str(action).lower()
+        with self.lock:
+            items = self.durations.get(self.get_key(etl_report_base_id), {}).get('items', {})
+            runs = items.get(f'{action}/{name}')
+            if not runs and fallback:
+                runs = [self.median(r) for k, r in items.items() if k.split('/', 1)[0] == action and r]
+            return self.median(runs) if runs else None
 class ETLReportBase():
     '''Process ETL / REPORT / DATABASE'''
     tables: list = [
@@ -283,9 +2005,30 @@ class ETLReportBase():
             "run_all_action": "notify"
         }
     ]
-    data: dict = None,
+    data: ETLData = None
+    fields: dict = None
     ref: datetime.date = datetime.datetime.now().date() - datetime.timedelta(days = 1)
-    log: dict = {}
+    log: StepLog = None
+    max_in_flight: int = 8
+    slots: threading.Semaphore = None
+    log_sink = None
+    checkpoints: CheckpointStore = None
+    durations: DurationStore = None
+    notify_db_data: str = 'full'
+    dependencies: dict = None
+    dag_report: dict = None
+    backfill_bases: dict = None
+    week_end: int = 6 # SUNDAY, THE weekday() OF THE WEEKLY REFS
+    periodicities: dict = None # {periodicity_id: name}, READ FROM THE periodicity TABLE WHEN NOT SET
+    periodicity_table: str = 'periodicity'
+    periodicity_names: dict = { # THE NAMES OF THE periodicity TABLE ROWS FOR EACH PERIODICITY
+        'daily': ['daily', 'day', 'diario', 'diaria', 'dia'],
+        'weekly': ['weekly', 'week', 'semanal', 'semana'],
+        'monthly': ['monthly', 'month', 'mensal', 'mes'],
+        'quarterly': ['quarterly', 'quarter', 'trimestral', 'trimestre'],
+        'semiannual': ['semiannual', 'semiannually', 'halfyearly', 'semestral', 'semestre'],
+        'yearly': ['yearly', 'annual', 'annually', 'year', 'anual', 'ano']
+    }
     allow_skip_conf: dict = {
         "extract": {
             "skip": False,
@@ -321,6 +2064,11 @@ class ETLReportBase():
     def __init__(self, cs:Init = None, steps: list = None):
         self.cs = Init() if not cs else cs
         self.steps = self.steps if not steps else steps
+        self._db_data_handle = None
+        self._saved_logs = None
+        self._handle_lock = threading.RLock()
+        self._resume = None
+        self._log_run = None
     def set_tables(self, tables: list):
         '''get ETL / REPORT / DATABASE tables'''
         if tables:
@@ -347,7 +2095,7 @@ class ETLReportBase():
         elif isinstance(ref, datetime.datetime):
             self.ref = ref.date()
         return self
-    def get_etl_report_base(self, pattern: str = None):
+    def get_etl_report_base(self, pattern: str = None, refresh: bool = False):
         '''GET avaliable ETL / REPORT / DATABASE'''
         _params = {
             'table': self.tables[0], 
@@ -355,31 +2103,97 @@ class ETLReportBase():
             'join': 'none',
             'pattern': pattern
         }
-        return self.cs.read_params(_params).read().get('data')
-    def get_data(self, etl_report_base: dict, tables: list = None, ref: datetime.date = None):
-        '''get ETL / REPORT / DATABASE Data Inputs | Outputs | ...'''
+        key = self.cs.cache_key('etl_report_base', _params)
+        cache = self.cs.get_etl_cache()
+        data = cache.get(key) if cache is not None and not refresh else None
+        if data is None:
+            data = self.cs.read(ReadParams(**_params)).get('data')
+            if cache is not None and data is not None:
+                cache.set(key, data, [self.tables[0]], ttl = self.cs.etl_cache_ttl)
+        return data
+    def find_etl_report_base(self, base) -> dict:
+        '''the single ETL / REPORT / BASE with the name or id (or matching the pattern)'''
+        if isinstance(base, dict):
+            return base
+        base = str(base)
+        return self.match_etl_report_base(base, self.get_etl_report_base(None if base.isdigit() else base))
+    def match_etl_report_base(self, base: str, bases: list) -> dict:
+        '''the base with the id / name of the bases read, or the only one'''
+        bases = bases or []
+        _bases = [b for b in bases if base in [str(b.get('etl_report_base_id')), b.get('etl_report_base')]] or bases
+        if len(_bases) != 1:
+            raise Exception(f'{len(_bases)} ETL / REPORT / BASE match {base}: {[b.get("etl_report_base") for b in _bases]}')
+        return _bases[0]
+    def get_run_conf(self, steps: list = None, concurrency: int = None, conf: dict = None) -> dict:
+        '''copy of the allow_skip_conf (or conf) skipping the actions not in steps, with the concurrency'''
+        conf = copy.deepcopy(conf or self.allow_skip_conf)
+        for step in self.steps:
+            action = step.get('run_all_action')
+            _conf = conf.setdefault(action, {})
+            if steps is not None and action not in steps:
+                _conf['skip'] = True
+            if concurrency:
+                _conf['concurrency'] = concurrency
+        return conf
+    def run_job(self, base, ref = None, steps: list = None, concurrency: int = None, conf: dict = None, dag: bool = False, resume: bool = False, save_logs: bool = False, plan: bool = False) -> dict:
+        '''get the data and run all for the base / ref, returns {base, ref, success, items, failed, logs}
+
+        With plan the items expected to take longest (per the log table) start first.
+        '''
+        base = self.find_etl_report_base(base)
+        self.set_allow_skip_conf(self.get_run_conf(steps, concurrency, conf))
+        if plan and self.durations is None:
+            self.set_durations()
+        self.get_data(base, ref = ref).run_all(dag = dag, resume = resume)
+        if save_logs:
+            self.save_logs()
+        return self.get_job_result(base)
+    def get_job_result(self, base: dict) -> dict:
+        '''{base, ref, success, items, failed, logs} of the run'''
+        logs = self.get_logs() or []
+        failed = [log for log in logs if not self.is_node_success([log])]
+        return {
+            'base': base.get('etl_report_base'),
+            'ref': self.ref,
+            'success': not failed,
+            'items': len(logs),
+            'failed': [{k: log.get(k) for k in ['type', 'name', 'msg']} for log in failed],
+            'logs': logs
+        }
+    def get_data(self, etl_report_base: dict, tables: list = None, ref: datetime.date = None, refresh: bool = False, fields: dict = None):
+        '''get ETL / REPORT / DATABASE Data Inputs | Outputs | ...
+
+        Nothing is read here, each table is read on its first access (the
+        ones a run needs in one call) with the fields {table: [field, ...]}.
+        '''
         if tables:
             self.set_tables(tables)
         if ref:
             self.set_ref(ref)
-        _params = {
-            'table': self.tables, 
-            'limit': -1, 
-            'join': 'none',
-            'filters': [
-                {
-                    'field': 'etl_report_base_id', 
-                    'cond': '=', 
-                    'value': etl_report_base.get('etl_report_base_id', etl_report_base.get('id'))
-                },
-                {
-                    'field': 'ref', 
-                    'cond': 'LIKE', 
-                    'value': self.ref.strftime('%Y-%m-%d')
-                }
-            ]
-        }
-        self.data = self.cs.read_params(_params).read().get('data')
+        if fields:
+            self.fields = fields
+        self.data = ETLData(self, etl_report_base.get('etl_report_base_id', etl_report_base.get('id')), refresh)
+        self._log_run = None # NEW DATA, NEW LOGS
+        return self
+    def get_table_fields(self, table: str) -> list:
+        '''fields read from the table, from the fields conf or its step "fields" (plus the ones the run uses), None for all'''
+        step = next((s for s in self.steps if s.get('table') == table), {})
+        fields = (self.fields or {}).get(table, step.get('fields'))
+        if not fields:
+            return None
+        needed = [step.get('name', table), f'{table}_id', 'active']
+        if step.get("run_all_action") in ['extract']:
+            needed.append('etl_rbase_input_conf')
+        return list(dict.fromkeys([*fields, *needed]))
+    def load_step_data(self, steps: list = None):
+        '''read the report base and the tables of the steps (default all) not skipped, in one call'''
+        if not isinstance(self.data, ETLData):
+            return self
+        tables = ['etl_report_base'] + [
+            step.get('table') for step in (steps or self.steps)
+            if self.allow_skip_conf.get(step.get("run_all_action"), {}).get('skip') is not True
+        ]
+        self.data.load(tables)
         return self
     def get_timer(self, start, end):
         '''get the start end time diff str'''
@@ -394,15 +2208,15 @@ class ETLReportBase():
         if allow_skip_conf:
             self.allow_skip_conf = allow_skip_conf
         return self
-    def run_step(self, step, data = None, ref = None):
-        '''RUN STEP'''
+    def get_step_ref(self, step, ref = None):
+        '''normalize the date ref for the step'''
         if not ref:
             ref = self.ref.strftime('%Y-%m-%d')
         elif isinstance(ref, (datetime.date, datetime.datetime)):
             ref = ref.strftime('%Y-%m-%d')
         elif isinstance(ref, list):
             ref = [
-                rf.strftime('%Y-%m-%d') if isinstance(ref, (datetime.date, datetime.datetime))
+                rf.strftime('%Y-%m-%d') if isinstance(rf, (datetime.date, datetime.datetime))
                 else rf for rf in ref
             ]
         _actions = ['transform', 'data_quality', 'data_reconcilia', 'export', 'notify']
@@ -411,204 +2225,351 @@ class ETLReportBase():
                 ref = [ ref ]
         if step.get('dates_refs') and not isinstance(ref, list):
             ref = [ ref ]
-        label = f'RUNNING: {step.get("run_all_action")}...'
+        return ref
+    def get_step_items(self, step, data = None) -> list:
+        '''return the active items of the step to be executed'''
+        if not data:
+            data = self.data[step.get("table")].get('data', [])
+        if not data:
+            return []
+        if isinstance(data, list) and step.get("run_all_action") in ['data_quality']:
+            data = data[:1]
+        elif not isinstance(data, list):
+            data = [ data ]
+        items = []
+        for d in data:
+            if step.get("run_all_action") in ['extract'] and not d.get('etl_rbase_input_conf'):
+                continue
+            if d.get('active') is False:
+                continue
+            items.append(d)
+        return items
+    def is_interrupted(self, name, _conf: dict) -> bool:
+        '''check the allow_specifics / skip_specifics conf for the item'''
+        # ONLY ALLOWED
+        if not _conf.get('allow_specifics'):
+            pass
+        elif not isinstance(_conf.get('allow_specifics'), list):
+            pass
+        elif len(_conf.get('allow_specifics')) == 0:
+            pass
+        elif name not in _conf.get('allow_specifics'):
+            return True
+        # SKIP NOT ALLOWED
+        if not _conf.get('skip_specifics'):
+            pass
+        elif not isinstance(_conf.get('skip_specifics'), list):
+            pass
+        elif len(_conf.get('skip_specifics')) == 0:
+            pass
+        elif name in _conf.get('skip_specifics'):
+            return True
+        return False
+    def _start_item(self, step, item, ref, _conf, selected_etlrb):
+        '''start the item log, returns (log, start, payload), payload is None if interrupted'''
+        log = StepLog(
+            type = step.get("run_all_action").upper(),
+            ref = ref if isinstance(ref, str) else ';'.join(ref),
+            name = item.get(step.get('name', step.get('table'))),
+            start = datetime.datetime.now().isoformat()
+        )
+        label = f'RUNNING: {step.get("run_all_action")}/{log.name}...'
         print(label)
+        start = time.time()
+        if self.is_interrupted(log.name, _conf):
+            log.success = False
+            log.msg = 'Interrupted by configuration'
+            end = time.time()
+            log.end = datetime.datetime.now().isoformat()
+            log.timer = self.get_timer(start, end)
+            log.duration = end - start
+            log.etl_report_base_id = selected_etlrb.get('etl_report_base_id')
+            self.record_item(log, start, end)
+            return log, start, None
+        payload = {
+            'step': {**step, 'date_ref': ref, 'dates_refs': ref},
+            'data': {**item, 'date_ref': ref},
+            'selected_etlrb': selected_etlrb,
+            'date_ref': ref,
+            'db_data': None
+        }
+        if step.get("run_all_action") == 'notify':
+            payload['db_data'] = self.get_db_data(step, item)
+            if payload['db_data'] is None:
+                payload['db_data_handle'] = self.get_db_data_handle()
+        return log, start, payload
+    def _finish_item(self, step, log, start, _aux, selected_etlrb) -> list:
+        '''close the item log with the api response, returns the log entries'''
+        log.success = _aux.get('success')
+        log.msg = _aux.get('msg')
+        log.num_rows = _aux.get('n_rows')
+        log.num_cols = _aux.get('n_cols')
+        log.fname = _aux.get('fname')
+        end = time.time()
+        log.end = datetime.datetime.now().isoformat()
+        log.timer = self.get_timer(start, end)
+        log.duration = end - start
+        log.etl_report_base_id = selected_etlrb.get('etl_report_base_id')
+        self.record_item(log, start, end)
+        if not _aux.get('data'): # HANDLE MULTILINE FEEDBACK
+            return [log]
+        logs = []
+        _data = _aux.get('data')
+        if step.get("run_all_action") in ['data_quality']:
+            for _dq in self.data[step.get("table")].get('data', []):
+                if _data['check'].get(_dq.get('etl_rbase_quality_id')):
+                    logs.append(log.copy(
+                        name = _dq.get('etl_rbase_quality'),
+                        errors = _data['check'].get(_dq.get('etl_rbase_quality_id')),
+                        fixes = _data['fix'].get(_dq.get('etl_rbase_quality_id'))
+                    ))
+        elif step.get("run_all_action") in ['export']:
+            for _d in _data:
+                log = log.copy(
+                    ref = _d.get('date_ref') if _d.get('date_ref') else log.ref,
+                    msg = _d.get('msg') if _d.get('msg') else log.msg,
+                    fname = _d.get('fname')
+                )
+                logs.append(log)
+        elif step.get("run_all_action") in ['data_reconcilia']:
+            for _d in _data:
+                log = log.copy(
+                    ref = _d.get('date_ref') if _d.get('date_ref') else log.ref,
+                    msg = _d.get('msg') if _d.get('msg') else log.msg,
+                    html = _d.get('html')
+                )
+                logs.append(log)
+        return logs
+    def _prepare_step(self, step, ref = None):
+        '''shared RUN STEP prelude, returns (ref, conf, api, selected_etlrb) or None if skipped'''
+        ref = self.get_step_ref(step, ref)
         _conf = self.allow_skip_conf.get(step.get("run_all_action"), {})
         if _conf.get('skip') is True:
-            return self
+            return None
+        self.load_step_data([step])
         api = f'{self.cs.host}/dyn_api/etl/{step.get("run_all_action")}'
-        self.log =  {
-            'type': step.get("run_all_action").upper(),
-            'ref': ref if isinstance(ref, str) else ';'.join(ref),
-        }
-        if not data:
-            data = self.data[step.get("table")].get('data', [])
+        if step.get("run_all_action") == 'notify':
+            self._db_data_handle = None
+            self._saved_logs = None
+        self.log = StepLog(
+            type = step.get("run_all_action").upper(),
+            ref = ref if isinstance(ref, str) else ';'.join(ref)
+        )
         selected_etlrb = self.data['etl_report_base'].get('data', [])[0]
+        if self.durations is not None:
+            self.durations.load(selected_etlrb.get('etl_report_base_id'))
         if not self.data['etl_report_base_log']:
             self.data['etl_report_base_log'] = {'data': []}
         elif not self.data['etl_report_base_log'].get('data'):
             self.data['etl_report_base_log']['data'] = []
-        if isinstance(data, list) and step.get("run_all_action") not in ['data_quality']:
-            for d in data:
-                if step.get("run_all_action") in ['extract'] and not d.get('etl_rbase_input_conf'):
-                    continue
-                if d.get('active') is False:
-                    continue
-                self.log =  {
-                    'type': step.get("run_all_action").upper(),
-                    'ref': ref if isinstance(ref, str) else ';'.join(ref),
-                    'name': d.get(step.get('name', step.get('table'))),
-                    'start': datetime.datetime.now().isoformat(),
-                }
-                label = f'RUNNING: {step.get("run_all_action")}/{self.log["name"]}...'
-                print(label)
-                start = time.time()
-                # ONLY ALLOWED
-                if not _conf.get('allow_specifics'):
-                    pass
-                elif not isinstance(_conf.get('allow_specifics'), list):
-                    pass
-                elif len(_conf.get('allow_specifics')) == 0:
-                    pass
-                elif self.log['name'] not in _conf.get('allow_specifics'):
-                    self.log['success'] = False
-                    self.log['msg'] = 'Interrupted by configuration'
-                    self.log['end'] = datetime.datetime.now().isoformat()
-                    end = time.time()
-                    self.log['timer'] = self.get_timer(start, end)
-                    self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-                    self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                    continue
-                # SKIP NOT ALLOWED
-                if not _conf.get('skip_specifics'):
-                    pass
-                elif not isinstance(_conf.get('skip_specifics'), list):
-                    pass
-                elif len(_conf.get('skip_specifics')) == 0:
-                    pass
-                elif self.log['name'] in _conf.get('skip_specifics'):
-                    self.log['success'] = False
-                    self.log['msg'] = 'Interrupted by configuration'
-                    end = time.time()
-                    self.log['end'] = datetime.datetime.now().isoformat()
-                    self.log['timer'] = self.get_timer(start, end)
-                    self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-                    self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                    continue
-                payload = {
-                    'step': {**step, 'date_ref': ref, 'dates_refs': ref},
-                    'data': {**d, 'date_ref': ref},
-                    'selected_etlrb': selected_etlrb,
-                    'date_ref': ref,
-                    'db_data': self.data if step.get("run_all_action") == 'notify' else None
-                }
+        return ref, _conf, api, selected_etlrb
+    def record_item(self, log: StepLog, start: float, end: float):
+        '''record the item in the Init metrics and its duration in the duration store'''
+        if self.cs.metrics is not None:
+            self.cs.metrics.record_item(log, start, end)
+        if self.durations is not None and log.success:
+            self.durations.record(log.etl_report_base_id, log.type, log.name, end - start)
+        return self
+    def save_stores(self):
+        '''persist the runs recorded in the checkpoint and duration stores, once per step / graph'''
+        if self.checkpoints is not None:
+            self.checkpoints.save()
+        if self.durations is not None:
+            self.durations.save()
+        return self
+    def set_durations(self, durations: DurationStore = None):
+        '''SET THE DURATION STORE (default the log table), the items expected to take longest start first'''
+        self.durations = DurationStore(self.cs) if durations is None else durations
+        return self
+    def get_expected(self, step, item, _conf: dict, selected_etlrb) -> float:
+        '''expected seconds of the item, None when unknown, 0 when interrupted by configuration'''
+        name = item.get(step.get('name', step.get('table')))
+        if self.is_interrupted(name, _conf):
+            return 0.0
+        if self.durations is None:
+            return None
+        return self.durations.get_expected(selected_etlrb.get('etl_report_base_id'), step.get("run_all_action"), name)
+    def get_item_order(self, step, items: list, _conf: dict, selected_etlrb) -> list:
+        '''indexes of the items, longest expected first (LPT) when there is a duration store'''
+        if self.durations is None:
+            return list(range(len(items)))
+        expected = [self.get_expected(step, item, _conf, selected_etlrb) or 0 for item in items]
+        return sorted(range(len(items)), key = lambda i: -expected[i])
+    def get_plan_ranks(self, plan: list, expected: dict = None) -> dict:
+        '''expected seconds from the start of each node to the end of its longest downstream chain'''
+        if expected is None:
+            expected = {
+                node['key']: self.get_expected(node['step'], node['item'], node['conf'], node['selected_etlrb']) or 0
+                for node in plan
+            } if self.durations is not None else {node['key']: 0 for node in plan}
+        downstream = {node['key']: [] for node in plan}
+        for node in plan:
+            for dep in node['deps']:
+                downstream[dep].append(node['key'])
+        left = {key: len(keys) for key, keys in downstream.items()}
+        todo = [key for key, n in left.items() if n == 0]
+        deps = {node['key']: node['deps'] for node in plan}
+        ranks = {}
+        while todo: # FROM THE LAST NODES UP
+            key = todo.pop()
+            ranks[key] = expected[key] + max((ranks[k] for k in downstream[key]), default = 0)
+            for dep in deps[key]:
+                left[dep] -= 1
+                if left[dep] == 0:
+                    todo.append(dep)
+        for key in deps: # CYCLES, run_dag RAISES ON THEM
+            ranks.setdefault(key, expected[key])
+        return ranks
+    def set_checkpoints(self, checkpoints: CheckpointStore):
+        '''SET THE CHECKPOINT STORE, every item run is recorded in it'''
+        self.checkpoints = checkpoints
+        return self
+    def get_resume_state(self, ref = None) -> dict:
+        '''the items of the plan with their log ref and upstream, checkpoints loaded'''
+        if self.checkpoints is None:
+            self.checkpoints = LogCheckpointStore(self.cs)
+        nodes, etl_report_base_id = {}, None
+        for node in self.get_plan(ref):
+            _ref = node['ref']
+            nodes[node['key'].split('#')[0]] = {
+                'action': node['action'],
+                'name': node['name'],
+                'ref': _ref if isinstance(_ref, str) else ';'.join(_ref),
+                'deps': [dep.split('#')[0] for dep in node['deps']]
+            }
+            etl_report_base_id = node['selected_etlrb'].get('etl_report_base_id')
+        refs = sorted({node['ref'] for node in nodes.values()})
+        self.checkpoints.load(etl_report_base_id, refs)
+        return {'nodes': nodes, 'ran': set(), 'etl_report_base_id': etl_report_base_id}
+    def get_checkpoint_log(self, step, item, ref, selected_etlrb):
+        '''log of an item skipped on resume, None when it has to run
+
+        The item is skipped when its checkpoint succeeded and none of its
+        upstream items ran in this run or after the checkpoint started.
+        '''
+        if self._resume is None:
+            return None
+        action = step.get("run_all_action")
+        name = item.get(step.get('name', step.get('table')))
+        ref = ref if isinstance(ref, str) else ';'.join(ref)
+        etl_report_base_id = selected_etlrb.get('etl_report_base_id')
+        checkpoint = self.checkpoints.get(etl_report_base_id, ref, action, name)
+        if not checkpoint or not checkpoint.get('success'):
+            return None
+        node = self._resume['nodes'].get(f'{action}/{name}', {})
+        for dep in node.get('deps', []):
+            if dep in self._resume['ran']:
+                return None
+            _node = self._resume['nodes'][dep]
+            _checkpoint = self.checkpoints.get(etl_report_base_id, _node['ref'], _node['action'], _node['name'])
+            if not _checkpoint:
+                continue
+            try:
+                if parser.parse(str(_checkpoint.get('end'))) > parser.parse(str(checkpoint.get('start'))):
+                    return None
+            except (ValueError, TypeError):
+                return None
+        now = datetime.datetime.now().isoformat()
+        log = StepLog(
+            type = action.upper(),
+            ref = ref,
+            name = name,
+            start = now,
+            success = True,
+            msg = f'Skipped, succeeded at {checkpoint.get("end")}',
+            end = now,
+            timer = self.get_timer(0, 0),
+            duration = 0.0,
+            etl_report_base_id = etl_report_base_id
+        )
+        print(f'SKIPPING: {action}/{name}, succeeded at {checkpoint.get("end")}')
+        return log
+    def set_checkpoint(self, step, item, ref, logs: list, selected_etlrb):
+        '''record the item run in the checkpoint store'''
+        action = step.get("run_all_action")
+        name = item.get(step.get('name', step.get('table')))
+        ref = ref if isinstance(ref, str) else ';'.join(ref)
+        if self._resume is not None:
+            with self._handle_lock:
+                self._resume['ran'].add(f'{action}/{name}')
+        if self.checkpoints is None or not logs or logs[0].get('msg') == 'Interrupted by configuration':
+            return self
+        self.checkpoints.set(
+            selected_etlrb.get('etl_report_base_id'), ref, action, name,
+            {'success': self.is_node_success(logs), 'start': logs[0].get('start'), 'end': logs[-1].get('end')}
+        )
+        return self
+    def get_step_concurrency(self, step, _conf: dict) -> int:
+        '''number of items run at once: the allow_skip_conf action or step "concurrency" (default one per
+        node of the host pool), capped by max_in_flight'''
+        if step.get("run_all_action") in ['notify']: # NOTIFY SENDS THE LOGS BEING WRITTEN
+            return 1
+        workers = _conf.get('concurrency', step.get('concurrency'))
+        if not workers and self.cs.hosts is not None: # ONE ITEM PER NODE OF THE HOST POOL
+            workers = len(self.cs.hosts.nodes)
+        if not workers:
+            return 1
+        return max(1, min(int(workers), self.max_in_flight))
+    def _run_item(self, step, item, ref, _conf, api, selected_etlrb) -> list:
+        '''run a single step item, returns its log entries'''
+        skipped = self.get_checkpoint_log(step, item, ref, selected_etlrb)
+        if skipped is not None:
+            return [skipped]
+        log, start, payload = self._start_item(step, item, ref, _conf, selected_etlrb)
+        if payload is None:
+            return [log]
+        if self.slots is not None:
+            with self.slots:
                 _aux = self.cs.api_call(api, {'data': payload})
-                self.log['success'] = _aux.get('success')
-                self.log['msg'] = _aux.get('msg')
-                self.log['num_rows'] = _aux.get('n_rows')
-                self.log['num_cols'] = _aux.get('n_cols')
-                self.log['fname'] = _aux.get('fname')
-                end = time.time()
-                self.log['end'] = datetime.datetime.now().isoformat()
-                self.log['timer'] = self.get_timer(start, end)
-                self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-                if not _aux.get('data'): # HANDLE MULTILINE FEEDBACK
-                    self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                elif step.get("run_all_action") in ['export']:
-                    _data = _aux.get('data')
-                    for _d in _data:
-                        self.log['ref'] = _d.get('date_ref') if _d.get('date_ref') else self.log['ref']
-                        self.log['msg'] = _d.get('msg') if _d.get('msg') else self.log['msg']
-                        self.log['fname'] = _d.get('fname')
-                        self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                elif step.get("run_all_action") in ['data_reconcilia']:
-                    _data = _aux.get('data')
-                    for _d in _data:
-                        self.log['ref'] = _d.get('date_ref') if _d.get('date_ref') else self.log['ref']
-                        self.log['msg'] = _d.get('msg') if _d.get('msg') else self.log['msg']
-                        self.log['html'] = _d.get('html')
-                        self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
         else:
-            if not data:
-                return self
-            elif isinstance(data, list) and step.get("run_all_action") in ['data_quality']:
-                if len(data) > 0:
-                    data = data[0]
-                else:
-                    return self
-            if step.get("run_all_action") in ['extract'] and not data.get('etl_rbase_input_conf'):
-                return self
-            if data.get('active') is False:
-                return self
-            self.log =  {
-                'type': step.get("run_all_action").upper(),
-                'ref': ref if isinstance(ref, str) else ';'.join(ref),
-                'name': data.get(step.get('name', step.get('table'))),
-                'start': datetime.datetime.now().isoformat(),
-            }
-            label = f'RUNNING: {step.get("run_all_action")}/{self.log["name"]}...'
-            print(label)
-            start = time.time()
-            # ONLY ALLOWED
-            if not _conf.get('allow_specifics'):
-                pass
-            elif not isinstance(_conf.get('allow_specifics'), list):
-                pass
-            elif len(_conf.get('allow_specifics')) == 0:
-                pass
-            elif self.log['name'] not in _conf.get('allow_specifics'):
-                self.log['success'] = False
-                self.log['msg'] = 'Interrupted by configuration'
-                end = time.time()
-                self.log['end'] = datetime.datetime.now().isoformat()
-                self.log['timer'] = self.get_timer(start, end)
-                self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-                self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                return self
-            # SKIP NOT ALLOWED
-            if not _conf.get('skip_specifics'):
-                pass
-            elif not isinstance(_conf.get('skip_specifics'), list):
-                pass
-            elif len(_conf.get('skip_specifics')) == 0:
-                pass
-            elif self.log['name'] in _conf.get('skip_specifics'):
-                self.log['success'] = False
-                self.log['msg'] = 'Interrupted by configuration'
-                end = time.time()
-                self.log['end'] = datetime.datetime.now().isoformat()
-                self.log['timer'] = self.get_timer(start, end)
-                self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-                self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-                return self
-            payload = {
-                'step': {**step, 'date_ref': ref, 'dates_refs': ref},
-                'data': {**data, 'date_ref': ref},
-                'selected_etlrb': selected_etlrb,
-                'date_ref': ref,
-                'db_data': self.data if step.get("run_all_action") == 'notify' else None
-            }
             _aux = self.cs.api_call(api, {'data': payload})
-            self.log['success'] = _aux.get('success')
-            self.log['msg'] = _aux.get('msg')
-            self.log['num_rows'] = _aux.get('n_rows')
-            self.log['num_cols'] = _aux.get('n_cols')
-            self.log['fname'] = _aux.get('fname')
-            self.log['end'] = datetime.datetime.now().isoformat()
-            end = time.time()
-            self.log['timer'] = self.get_timer(start, end)
-            self.log['etl_report_base_id'] = selected_etlrb.get('etl_report_base_id')
-            if not _aux.get('data'): # HANDLE MULTILINE FEEDBACK
-                self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-            elif step.get("run_all_action") in ['data_quality']:
-                _data = _aux.get('data')
-                for _dq in self.data[step.get("table")].get('data', []):
-                    if _data['check'].get(_dq.get('etl_rbase_quality_id')):
-                        self.log['name'] = _dq.get('etl_rbase_quality')
-                        self.log['errors'] = _data['check'].get(_dq.get('etl_rbase_quality_id'))
-                        self.log['fixes'] = _data['fix'].get(_dq.get('etl_rbase_quality_id'))
-                        self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-            elif step.get("run_all_action") in ['export']:
-                _data = _aux.get('data')
-                for _d in _data:
-                    self.log['ref'] = _d.get('date_ref') if _d.get('date_ref') else self.log['ref']
-                    self.log['msg'] = _d.get('msg') if _d.get('msg') else self.log['msg']
-                    self.log['fname'] = _d.get('fname')
-                    self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
-            elif step.get("run_all_action") in ['data_reconcilia']:
-                _data = _aux.get('data')
-                for _d in _data:
-                    self.log['ref'] = _d.get('date_ref') if _d.get('date_ref') else self.log['ref']
-                    self.log['msg'] = _d.get('msg') if _d.get('msg') else self.log['msg']
-                    self.log['html'] = _d.get('html')
-                    self.data['etl_report_base_log']['data'].append(copy.deepcopy(self.log))
+        logs = self._finish_item(step, log, start, _aux, selected_etlrb)
+        self.set_checkpoint(step, item, ref, logs or [log], selected_etlrb)
+        return logs
+    def append_logs(self, logs: list):
+        '''append the item log entries to the execution logs'''
+        if logs:
+            self.log = logs[-1]
+        if self.log_sink is not None:
+            with self._handle_lock:
+                if self._log_run is None:
+                    self._log_run = self.log_sink.begin()
+            self.log_sink.write(logs, self._log_run)
+        else:
+            self.data['etl_report_base_log']['data'].extend(logs)
+        return self
+    def run_step(self, step, data = None, ref = None):
+        '''RUN STEP'''
+        step_start = time.time()
+        label = f'RUNNING: {step.get("run_all_action")}...'
+        print(label)
+        _prep = self._prepare_step(step, ref)
+        if not _prep:
+            return self
+        ref, _conf, api, selected_etlrb = _prep
+        items = self.get_step_items(step, data)
+        workers = self.get_step_concurrency(step, _conf)
+        if workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers = workers) as executor:
+                futures = {
+                    i: executor.submit(self._run_item, step, items[i], ref, _conf, api, selected_etlrb)
+                    for i in self.get_item_order(step, items, _conf, selected_etlrb)
+                }
+                for i in range(len(items)): # KEEP THE ORIGINAL ORDER IN THE LOGS
+                    self.append_logs(futures[i].result())
+        else:
+            for item in items:
+                self.append_logs(self._run_item(step, item, ref, _conf, api, selected_etlrb))
+        self.save_stores()
+        if self.cs.metrics is not None:
+            self.cs.metrics.record_step(step.get("run_all_action"), step_start, time.time())
         label = f'FINISHING: {step.get("run_all_action")}...'
         print(label)
         return self
     def run_filtered(self, _filter: str, ref = None):
         '''IILTERED'''
         _step = list(filter(lambda s: s.get('run_all_action') == _filter, self.steps))
-        return self.run_step(_step[0], ref)
+        return self.run_step(_step[0], ref = ref)
     def inputs(self, ref = None):
         '''RUN INPUTS | EXTRACTIONS'''
         return self.run_filtered('extract', ref)
@@ -627,18 +2588,1359 @@ class ETLReportBase():
     def notify(self, ref = None):
         '''RUN DATA NOTIFY'''
         return self.run_filtered('notify', ref)
-    def run_all(self, ref = None):
-        '''RUN ALL'''
+    def run_all(self, ref = None, dag: bool = False, resume: bool = False):
+        '''RUN ALL, step by step or as a dependency graph with dag = True
+
+        With resume the items that already succeeded for the ref (per the
+        checkpoints, by default the saved logs) are skipped, unless their
+        upstream ran again since.
+        '''
+        self.load_step_data()
+        self._resume = self.get_resume_state(ref) if resume else None
+        try:
+            if dag:
+                return self.run_dag(ref)
+            for step in self.steps:
+                self.run_step(step, ref = ref)
+        finally:
+            self._resume = None
+            self.flush_logs()
+        return self
+    def set_dependencies(self, dependencies: dict):
+        '''SET ITEM DEPENDENCIES {"action/name": ["action/name", "name" or "action", ...]}'''
+        if dependencies:
+            self.dependencies = dependencies
+        return self
+    def get_item_deps(self, key: str, item: dict):
+        '''declared upstream of the item, from the dependencies conf or the item depends_on, None if not declared'''
+        deps = self.split_deps((self.dependencies or {}).get(key))
+        if deps is None and isinstance(item, dict):
+            deps = self.split_deps(item.get('depends_on'))
+        return deps
+    @staticmethod
+    def split_deps(deps) -> list:
+        '''list of the dependencies "a, b; c" or [a, b], None when empty (not declared)'''
+        if isinstance(deps, str):
+            deps = [d.strip() for d in re.split('[,;]', deps) if d.strip()]
+        return list(deps) if deps else None
+    def get_plan(self, ref = None) -> list:
+        '''build the item graph, one node per item, upstream from the declarations or else the previous step'''
+        self.load_step_data()
+        nodes = []
+        prev_keys = []
         for step in self.steps:
-            self.run_step(step, ref)
+            _prep = self._prepare_step(step, ref)
+            if not _prep:
+                continue
+            _ref, _conf, api, selected_etlrb = _prep
+            keys = []
+            for item in self.get_step_items(step):
+                name = item.get(step.get('name', step.get('table')))
+                key = f'{step.get("run_all_action")}/{name}'
+                if key in keys:
+                    key = f'{key}#{len([k for k in keys if k.split("#")[0] == key]) + 1}'
+                declared = self.get_item_deps(key, item)
+                nodes.append({
+                    'key': key,
+                    'action': step.get("run_all_action"),
+                    'name': name,
+                    'step': step,
+                    'item': item,
+                    'ref': _ref,
+                    'conf': _conf,
+                    'api': api,
+                    'selected_etlrb': selected_etlrb,
+                    'declared': declared,
+                    'deps': list(prev_keys) if declared is None else []
+                })
+                keys.append(key)
+            if keys:
+                prev_keys = keys
+        actions = [step.get("run_all_action") for step in self.steps]
+        for node in nodes:
+            if node['declared'] is None:
+                continue
+            for dep in node['declared']:
+                matched = [
+                    _node['key'] for _node in nodes
+                    if _node is not node
+                    and dep in (_node['key'], _node['key'].split('#')[0], _node['name'], _node['action'])
+                ]
+                if not matched and dep not in actions: # A STEP WITH NO ITEMS (OR SKIPPED) IS NO UPSTREAM
+                    raise Exception(f'Unresolved dependency {dep} of {node["key"]}')
+                node['deps'].extend(key for key in matched if key not in node['deps'])
+        return nodes
+    def _run_node(self, node: dict):
+        '''run a graph node, returns (logs, start, end)'''
+        start = time.time()
+        logs = self._run_item(
+            node['step'], node['item'], node['ref'], node['conf'], node['api'], node['selected_etlrb']
+        )
+        return logs, start, time.time()
+    def _skipped_log(self, node: dict, failed: list) -> StepLog:
+        '''log entry of a node skipped because its upstream failed'''
+        now = datetime.datetime.now().isoformat()
+        ref = node['ref']
+        return StepLog(
+            type = node['action'].upper(),
+            ref = ref if isinstance(ref, str) else ';'.join(ref),
+            name = node['name'],
+            start = now,
+            success = False,
+            msg = f'Skipped, upstream failed: {", ".join(failed)}',
+            end = now,
+            timer = self.get_timer(0, 0),
+            duration = 0.0,
+            etl_report_base_id = node['selected_etlrb'].get('etl_report_base_id')
+        )
+    def is_node_success(self, logs: list) -> bool:
+        '''a node succeeds when all its logs do, interrupted by configuration counts as done'''
+        return all(
+            log.get('success') or log.get('msg') == 'Interrupted by configuration'
+            for log in logs
+        )
+    def run_dag(self, ref = None, max_workers: int = None):
+        '''RUN ALL AS A DEPENDENCY GRAPH
+
+        Each item starts as soon as its upstream items succeed (at most
+        max_workers, default max_in_flight, at once) and is skipped when one
+        of them fails, except notify items that always run. With a duration
+        store the ready items with the longest expected chain start first. The
+        logs keep the plan order and the timings go to dag_report.
+        '''
+        plan = self.get_plan(ref)
+        order = [node['key'] for node in plan]
+        pending = {node['key']: node for node in plan}
+        ranks = self.get_plan_ranks(plan)
+        status, results, timings, done_order, ready = {}, {}, {}, [], []
+        flushed = 0
+        workers = max_workers or self.max_in_flight
+        run_start = time.time()
+        print('RUNNING: dag...')
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            running = {}
+            while pending or ready or running:
+                progress = True
+                while progress:
+                    progress = False
+                    for key in list(pending):
+                        node = pending[key]
+                        if any(dep not in status for dep in node['deps']):
+                            continue
+                        del pending[key]
+                        progress = True
+                        failed = [dep for dep in node['deps'] if status[dep] != 'success']
+                        if failed and node['action'] not in ['notify']:
+                            now = time.time()
+                            results[key] = [self._skipped_log(node, failed)]
+                            timings[key] = (now, now)
+                            status[key] = 'skipped'
+                            done_order.append(key)
+                            continue
+                        ready.append(node)
+                ready.sort(key = lambda n: -ranks[n['key']]) # LONGEST EXPECTED CHAIN FIRST
+                while ready and len(running) < workers:
+                    node = ready.pop(0)
+                    running[executor.submit(self._run_node, node)] = node['key']
+                while flushed < len(order) and order[flushed] in results: # KEEP THE PLAN ORDER IN THE LOGS
+                    self.append_logs(results[order[flushed]])
+                    flushed += 1
+                if not running:
+                    if pending:
+                        raise Exception(f'Cyclic item dependencies: {", ".join(pending)}')
+                    break
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    logs, start, end = future.result()
+                    results[key] = logs
+                    timings[key] = (start, end)
+                    status[key] = 'success' if self.is_node_success(logs) else 'failed'
+                    done_order.append(key)
+        for key in order[flushed:]:
+            self.append_logs(results[key])
+        self.save_stores()
+        self.dag_report = self.get_dag_report(plan, status, timings, done_order, run_start, time.time())
+        print(
+            f'FINISHING: dag... WALL: {self.get_timer(0, self.dag_report["wall_time"])}'
+            f' CRITICAL PATH: {self.get_timer(0, self.dag_report["critical_path_time"])}'
+            f' SUM: {self.get_timer(0, self.dag_report["sum_time"])}'
+        )
         return self
+    def get_dag_report(self, plan: list, status: dict, timings: dict, done_order: list, run_start: float, run_end: float) -> dict:
+        '''per node timings and the critical path (longest chain of node durations) of a run_dag'''
+        deps = {node['key']: node['deps'] for node in plan}
+        finish, prev = {}, {}
+        for key in done_order: # COMPLETION ORDER IS A TOPOLOGICAL ORDER
+            start, end = timings[key]
+            upstream = max(deps[key], key = lambda d: finish.get(d, 0), default = None)
+            prev[key] = upstream
+            finish[key] = (finish.get(upstream, 0) if upstream else 0) + (end - start)
+        path = []
+        key = max(finish, key = finish.get, default = None)
+        while key:
+            path.insert(0, key)
+            key = prev.get(key)
+        return {
+            'wall_time': run_end - run_start,
+            'sum_time': sum(end - start for start, end in timings.values()),
+            'critical_path': path,
+            'critical_path_time': max(finish.values(), default = 0),
+            'nodes': {
+                key: {
+                    'status': status.get(key),
+                    'deps': deps[key],
+                    'start': timings[key][0] - run_start,
+                    'end': timings[key][1] - run_start,
+                    'duration': timings[key][1] - timings[key][0]
+                } for key in timings
+            }
+        }
+    @staticmethod
+    def get_makespan(durations: list, workers: int) -> float:
+        '''finish time of the durations started in order on the first free of the workers'''
+        loads = [0.0] * max(1, workers)
+        for duration in durations:
+            heapq.heapreplace(loads, loads[0] + duration)
+        return max(loads)
+    def get_dag_makespan(self, plan: list, expected: dict, ranks: dict, workers: int) -> float:
+        '''finish time of run_dag with the expected durations, every item succeeding'''
+        now, finish, running, ready = 0.0, set(), [], []
+        pending = {node['key']: node for node in plan}
+        while pending or ready or running:
+            for key in [k for k, node in pending.items() if all(dep in finish for dep in node['deps'])]:
+                ready.append(key)
+                del pending[key]
+            ready.sort(key = lambda k: -ranks[k])
+            while ready and len(running) < workers:
+                key = ready.pop(0)
+                heapq.heappush(running, (now + expected[key], key))
+            if not running:
+                break
+            now, key = heapq.heappop(running)
+            finish.add(key)
+        return now
+    def explain(self, ref = None, dag: bool = False, max_workers: int = None) -> dict:
+        '''PREDICTED DURATION OF run_all FOR THE REF, PER STEP AND IN TOTAL
+
+        The items take the median of their past runs (the duration store,
+        by default the log table) and start longest expected first on the
+        step workers, or on the graph with dag = True. Items without history
+        ("known": False) take the median of their step, or count as 0.
+        '''
+        if self.durations is None:
+            self.set_durations()
+        plan = self.get_plan(ref)
+        expected, known, steps = {}, {}, {}
+        for node in plan:
+            _expected = self.get_expected(node['step'], node['item'], node['conf'], node['selected_etlrb'])
+            expected[node['key']] = _expected or 0.0
+            known[node['key']] = _expected == 0 or self.durations.get_expected(
+                node['selected_etlrb'].get('etl_report_base_id'), node['action'], node['name'], fallback = False
+            ) is not None
+            _step = steps.setdefault(node['action'], {
+                'action': node['action'],
+                'workers': self.get_step_concurrency(node['step'], node['conf']),
+                'items': []
+            })
+            _step['items'].append({'key': node['key'], 'expected': expected[node['key']], 'known': known[node['key']]})
+        for _step in steps.values():
+            _step['items'].sort(key = lambda item: -item['expected'])
+            _step['predicted'] = self.get_makespan([item['expected'] for item in _step['items']], _step['workers'])
+            _step['sum'] = sum(item['expected'] for item in _step['items'])
+        ranks = self.get_plan_ranks(plan, expected)
+        workers = max_workers or self.max_in_flight
+        res = {
+            'ref': self.get_step_ref({}, ref),
+            'dag': dag,
+            'steps': list(steps.values()),
+            'total': self.get_dag_makespan(plan, expected, ranks, workers) if dag else sum(_step['predicted'] for _step in steps.values()),
+            'sum': sum(expected.values()),
+            'critical_path_time': max(ranks.values(), default = 0),
+            'unknown': [key for key, _known in known.items() if not _known]
+        }
+        for _step in res['steps']:
+            print(f'EXPLAIN: {_step["action"]} {len(_step["items"])} items x{_step["workers"]} ~{self.get_timer(0, _step["predicted"])}')
+        print(f'EXPLAIN: total ~{self.get_timer(0, res["total"])}{" (dag)" if dag else ""}, {len(res["unknown"])} items without history')
+        return res
+    def get_periodicity_name(self, name) -> str:
+        '''the periodicity (daily, weekly ...) of a name of the periodicity table, None when unknown'''
+        if not isinstance(name, str):
+            return None
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+        name = re.sub('[^a-z]', '', name.lower())
+        return next((k for k, names in self.periodicity_names.items() if name in names), None)
+    def get_periodicities(self, refresh: bool = False) -> dict:
+        '''{periodicity_id: periodicity} from the periodicity table of the server (cached), unless set'''
+        if self.periodicities is not None and not refresh:
+            return self.periodicities
+        table = self.periodicity_table
+        _params = {'table': table, 'limit': -1, 'join': 'none'}
+        key = self.cs.cache_key('periodicity', _params)
+        rows = self.cs.cache.get(key) if self.cs.cache is not None and not refresh else None
+        if rows is None:
+            res = self.cs.read(ReadParams(**_params))
+            if not res.get('success'):
+                raise Exception(f'Could not read the {table} table: {res.get("msg", res.get("message"))}')
+            rows = res.get('data') or []
+            if self.cs.cache is not None:
+                self.cs.cache.set(key, rows, [table])
+        self.periodicities = {
+            row.get(f'{table}_id'): self.get_periodicity_name(row.get(table, row.get('name')))
+            for row in rows
+        }
+        return self.periodicities
+    def get_refs(self, start, end = None, periodicity = None) -> list:
+        '''date refs from start to end for the periodicity, a name (daily, weekly ...) or a periodicity_id
+
+        The refs are the period ends (weeks end on week_end). The periodicity_id
+        (by default the report base one) is looked up in the periodicity table
+        of the server, an id missing there or with a name not in
+        periodicity_names raises.
+        '''
+        def _date(ref):
+            if isinstance(ref, datetime.datetime):
+                return ref.date()
+            if isinstance(ref, datetime.date):
+                return ref
+            return parser.parse(ref).date()
+        start = _date(start)
+        end = _date(end) if end else start
+        if periodicity is None and self.data and self.data.get('etl_report_base'):
+            periodicity = self.data['etl_report_base'].get('data', [{}])[0].get('periodicity_id')
+        if periodicity is None:
+            raise Exception('No periodicity, the report base has no periodicity_id!')
+        if self.get_periodicity_name(periodicity) is not None:
+            periodicity = self.get_periodicity_name(periodicity)
+        else:
+            periodicities = {str(k): v for k, v in self.get_periodicities().items()}
+            if not periodicities.get(str(periodicity)):
+                raise Exception(f'Unknown periodicity {periodicity} in the {self.periodicity_table} table, pass the periodicity name!')
+            periodicity = periodicities[str(periodicity)]
+        months = {'monthly': 1, 'quarterly': 3, 'semiannual': 6, 'yearly': 12}
+        refs = []
+        if periodicity in ['daily', 'weekly']:
+            days = 1 if periodicity == 'daily' else 7
+            ref = start
+            if periodicity == 'weekly': # THE WEEK END
+                ref += datetime.timedelta(days = (self.week_end - start.weekday()) % 7)
+            while ref <= end:
+                refs.append(ref)
+                ref += datetime.timedelta(days = days)
+        elif periodicity in months:
+            year, month = start.year, start.month
+            while True:
+                if month % months[periodicity] == 0:
+                    ref = datetime.date(year, month, calendar.monthrange(year, month)[1])
+                    if ref > end:
+                        break
+                    if ref >= start:
+                        refs.append(ref)
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        else:
+            raise Exception(f'Unknown periodicity {periodicity}!')
+        return refs
+    def copy_base(self, ref = None):
+        '''new ETLReportBase on the same Init and conf with a copy of the data and empty logs'''
+        base = self.__class__(self.cs, self.steps)
+        base.tables = self.tables
+        base.allow_skip_conf = self.allow_skip_conf
+        base.dependencies = self.dependencies
+        base.max_in_flight = self.max_in_flight
+        base.slots = self.slots
+        base.log_sink = self.log_sink
+        base.checkpoints = self.checkpoints
+        base.durations = self.durations
+        base.ref = self.ref
+        base.set_ref(ref)
+        if isinstance(self.data, ETLData):
+            base.data = ETLData(base, self.data.etl_report_base_id, self.data.refresh, parent = self.data)
+        elif isinstance(self.data, dict):
+            base.data = {k: v for k, v in self.data.items() if k != 'etl_report_base_log'}
+            base.data = copy.deepcopy(base.data)
+            base.data['etl_report_base_log'] = {'data': []}
+        return base
+    def backfill(self, start, end = None, etl_report_base: dict = None, periodicity = None, width: int = 4, dag: bool = False, resume: bool = False) -> dict:
+        '''RUN ALL FOR EVERY REF FROM start TO end
+
+        The refs follow the periodicity (default the report base periodicity_id),
+        and width refs run at once, all from the same fetched data. The base of
+        each ref ends up in backfill_bases. Returns {ref: {action: {items, success, failed}}},
+        plus "error" for the refs that raised.
+        '''
+        if etl_report_base:
+            self.get_data(etl_report_base)
+        if not self.data:
+            raise Exception('Run .get_data first or pass the etl_report_base!')
+        self.load_step_data() # ONCE FOR EVERY REF
+        refs = self.get_refs(start, end, periodicity)
+        self.backfill_bases = {ref.strftime('%Y-%m-%d'): self.copy_base(ref) for ref in refs}
+        errors = {}
+        def _run(ref, base):
+            try:
+                base.run_all(dag = dag, resume = resume)
+            except Exception as _err:
+                print(f'BACKFILL ERR: {base.ref}', str(_err))
+                errors[ref] = str(_err)
+            return base
+        with ThreadPoolExecutor(max_workers = max(1, width)) as executor:
+            list(executor.map(lambda item: _run(*item), self.backfill_bases.items()))
+        return self.get_backfill_matrix(errors)
+    def get_backfill_matrix(self, errors: dict = None) -> dict:
+        '''{ref: {action: {items, success, failed}}} of the backfill_bases, with the "error" of the refs that raised'''
+        matrix = {}
+        for ref, base in self.backfill_bases.items():
+            matrix[ref] = {'error': errors[ref]} if ref in (errors or {}) else {}
+            for step in self.steps:
+                action = step.get("run_all_action")
+                logs = [
+                    log for log in base.get_logs()
+                    if log.get('type') == action.upper() and ref in str(log.get('ref')).split(';')
+                ]
+                matrix[ref][action] = {
+                    'items': len(logs),
+                    'success': len([log for log in logs if log.get('success')]),
+                    'failed': len([log for log in logs if not log.get('success')])
+                }
+        return matrix
+    def set_log_sink(self, log_sink: LogSink):
+        '''SET THE LOG SINK, the logs are written to it instead of kept in data'''
+        self.log_sink = log_sink
+        self._log_run = None
+        return self
+    def get_sink_logs(self) -> list:
+        '''the logs this base wrote to the log sink since get_data, not the other runs in it'''
+        if self._log_run is None:
+            return []
+        return self.log_sink.read(self._log_run)
+    def flush_logs(self):
+        '''wait for the log sink to write the logs queued'''
+        if self.log_sink is not None:
+            self.log_sink.flush()
+        return self
+    def get_notify_mode(self, step: dict = None) -> str:
+        '''how the notify gets the data: "auto", "full" or "handle", from the allow_skip_conf notify action or the step'''
+        _conf = self.allow_skip_conf.get('notify', {})
+        return _conf.get('notify_db_data', (step or {}).get('notify_db_data', self.notify_db_data))
+    def get_db_data(self, step: dict = None, item: dict = None, mode: str = None):
+        '''the data sent to the notify
+
+        "full" sends the whole snapshot, "auto" only the sections (tables) and
+        fields named in the notify item (its subject, template, conf ...), and
+        "handle" sends nothing, the snapshot goes once per step as an upload.
+        Only the tables sent are read, the logs are the ones saved for the ref
+        and the ones of this run.
+        '''
+        mode = mode or self.get_notify_mode(step)
+        if mode == 'handle':
+            return None
+        words = None
+        if mode != 'full' and item:
+            text = ' '.join(v for v in item.values() if isinstance(v, str))
+            words = set(re.findall(r'\w+', text))
+        tables = [
+            table for table in self.data
+            if words is None or table == 'etl_report_base' or table in words
+        ]
+        if isinstance(self.data, ETLData):
+            self.data.load(tables)
+        data = {}
+        for table in tables:
+            if table == 'etl_report_base_log':
+                data[table] = {**(self.data.get(table) or {}), 'data': self.get_notify_logs()}
+            else:
+                data[table] = self.data[table]
+        if words is None:
+            return data
+        slim = {}
+        for table, section in data.items():
+            if table == 'etl_report_base' or not isinstance(section, dict) or not isinstance(section.get('data'), list):
+                slim[table] = section
+                continue
+            keys = []
+            for row in section['data']:
+                for k in row.keys():
+                    if k not in keys:
+                        keys.append(k)
+            used = [k for k in keys if k in words]
+            rows = [{k: row.get(k) for k in used} for row in section['data']] if used else section['data']
+            slim[table] = {**section, 'data': rows}
+        return slim
+    def get_notify_logs(self) -> list:
+        '''the logs saved for the ref (not already in this run, read once per notify step) and the logs of this run'''
+        _logs = self.data.get('etl_report_base_log') or {}
+        logs = list(_logs.get('data') or [])
+        if self.log_sink is not None:
+            logs += self.get_sink_logs()
+        if not isinstance(self.data, ETLData):
+            return logs
+        _key = lambda log: (log.get('type'), log.get('name'), str(log.get('ref')), str(log.get('start')))
+        with self._handle_lock:
+            if self._saved_logs is None:
+                self._saved_logs = list(self.data.iter_saved_logs())
+        keys = {_key(log) for log in logs}
+        return [log for log in self._saved_logs if _key(log) not in keys] + logs
+    def get_db_data_handle(self):
+        '''upload the data snapshot once per notify step, returns the upload response'''
+        with self._handle_lock:
+            if self._db_data_handle is None:
+                with tempfile.NamedTemporaryFile('wb', suffix = '.json', delete = False) as _file:
+                    _file.write(dumps(self.get_db_data(mode = 'full')))
+                try:
+                    res = self.cs.upload({'tmp': True}, _file.name)
+                finally:
+                    os.remove(_file.name)
+                if res.get('success') is False:
+                    raise Exception(res.get('msg', res.get('message')))
+                self._db_data_handle = res
+            return self._db_data_handle
     def get_logs(self):
         '''return the logs of the execution'''
-        return self.data['etl_report_base_log'].get('data')
+        if self.log_sink is not None:
+            return self.get_sink_logs()
+        logs = self.data['etl_report_base_log'].get('data')
+        if logs is None:
+            return logs
+        return [log.to_dict() if isinstance(log, StepLog) else log for log in logs]
+    def get_logs_frame(self, kind: str = 'pandas', fields: list = None):
+        '''return the logs as a pandas DataFrame or a pyarrow Table (kind = "arrow"), built column-wise'''
+        if self.log_sink is not None:
+            logs = self.get_sink_logs()
+        else:
+            logs = self.data['etl_report_base_log'].get('data') or []
+        if fields is None:
+            fields = [k for k in StepLog.__slots__ if any(k in log for log in logs)]
+        return columns_to_frame(rows_to_columns(logs, fields), kind, StepLog.types)
     def save_logs(self):
         '''SAVE THE LOGS GENERATE DURING THE PROCESSING'''
+        if isinstance(self.log_sink, APILogSink):
+            self.log_sink.flush()
+            return self
         logs = self.get_logs()
-        res = self.cs.create_params({'table': 'etl_report_base_log', 'data': logs})\
-                    .create()
+        res = self.cs.create(CreateParams(table = 'etl_report_base_log', data = logs))
+        print(res.get('msg'))
+        return self
+class AsyncInit():
+    """Asyncio client mirroring Init
+
+    Not an async transport: the calls go through the blocking pooled session
+    of the wrapped Init on an executor of max_concurrency threads, so each
+    call in flight still holds a thread. The event loop stays free, and the
+    calls beyond max_concurrency wait on a semaphore (one per event loop)
+    without a thread.
+    """
+    def __init__(self, cs: Init = None, max_concurrency: int = 10):
+        self.cs = Init() if not cs else cs
+        self.max_concurrency = max_concurrency
+        if self.cs.pool_maxsize < max_concurrency:
+            self.cs.pool_maxsize = max_concurrency
+        self._semaphore = None
+        self._loop = None
+        self._executor = None
+    @property
+    def host(self):
+        '''host of the wrapped Init'''
+        return self.cs.host
+    def get_executor(self) -> ThreadPoolExecutor:
+        '''return the executor running the blocking transport'''
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers = self.max_concurrency)
+        return self._executor
+    def get_semaphore(self) -> asyncio.Semaphore:
+        '''the concurrency semaphore of the running event loop, a new one for each loop (asyncio.run)'''
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+    async def run(self, fn, *args, **kwargs):
+        '''run a blocking callable on the executor, bounded by the concurrency semaphore'''
+        async with self.get_semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), lambda: fn(*args, **kwargs))
+    async def api_call(self, api: str, payload: dict):
+        '''API CALL'''
+        return await self.run(self.cs.api_call, api, payload)
+    def set_lang(self, lang: str = 'en'):
+        '''LANG'''
+        self.cs.set_lang(lang)
+        return self
+    async def login(self, user: str = None, password: str = None):
+        '''LOGIN'''
+        await self.run(self.cs.login, user, password)
+        return self
+    async def get_apps(self, refresh: bool = False):
+        '''GET APP'''
+        await self.run(self.cs.get_apps, refresh)
+        return self
+    async def get_tables(self, table: str = None, refresh: bool = False):
+        '''GET TABLES'''
+        await self.run(self.cs.get_tables, table, refresh)
+        return self
+    def set_app(self, app: str):
+        '''SET APP'''
+        self.cs.set_app(app)
+        return self
+    async def read(self, payload = None, refresh: bool = False):
+        '''READ'''
+        if isinstance(payload, dict):
+            payload = ReadParams(**payload)
+        if not payload:
+            payload = self.cs._r_params
+        return await self.run(self.cs.cached_read, payload.get_dict(), refresh)
+    async def _write(self, action: str, payload = None):
+        if isinstance(payload, dict):
+            payload = CreateParams(**payload)
+        if not payload:
+            payload = self.cs._c_params
+        api = f'{self.cs.host}/dyn_api/crud/{action}'
+        res = await self.api_call(api, {'data': payload.get_dict()})
+        self.cs.invalidate(payload.table)
+        return res
+    async def create(self, payload = None):
+        '''CREATE'''
+        return await self._write('create', payload)
+    async def update(self, payload = None):
+        '''UPDATE'''
+        return await self._write('update', payload)
+    async def delete(self, payload = None):
+        '''DELETE'''
+        return await self._write('delete', payload)
+    async def query(self, payload = None):
+        '''QUERY'''
+        if not payload:
+            raise Exception('No PAYLOAD!')
+        api = f'{self.cs.host}/dyn_api/crud/query'
+        return await self.api_call(api, {'data': payload})
+    async def etl(self, action, payload):
+        '''GENERIC ETL'''
+        if not payload:
+            raise Exception('No PAYLOAD!')
+        api = f'{self.cs.host}/dyn_api/etl/{action}'
+        return await self.api_call(api, {'data': payload})
+    async def upload(self, payload: dict, file_path: str):
+        '''UPLOAD FILE'''
+        return await self.run(self.cs.upload, payload, file_path)
+    async def upload_stream(self, payload: dict, file_path: str, **kwargs):
+        '''UPLOAD FILE IN CHUNKS'''
+        return await self.run(self.cs.upload_stream, payload, file_path, **kwargs)
+    def close(self):
+        '''CLOSE THE EXECUTOR AND THE POOLED CONNECTIONS'''
+        if self._executor is not None:
+            self._executor.shutdown(wait = True)
+            self._executor = None
+        self.cs.close()
+        return self
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *exc):
+        self.close()
+class AsyncETLReportBase(ETLReportBase):
+    '''Process ETL / REPORT / DATABASE with awaitable steps'''
+    def __init__(self, cs = None, steps: list = None, max_concurrency: int = 10):
+        self.acs = cs if isinstance(cs, AsyncInit) else AsyncInit(cs, max_concurrency)
+        super().__init__(self.acs.cs, steps)
+    async def get_etl_report_base(self, pattern: str = None, refresh: bool = False):
+        '''GET avaliable ETL / REPORT / DATABASE'''
+        return await self.acs.run(super().get_etl_report_base, pattern, refresh)
+    async def get_data(self, etl_report_base: dict, tables: list = None, ref: datetime.date = None, refresh: bool = False, fields: dict = None):
+        '''get ETL / REPORT / DATABASE Data Inputs | Outputs | ..., read on first access'''
+        super().get_data(etl_report_base, tables, ref, refresh, fields)
+        return self
+    async def run_step(self, step, data = None, ref = None):
+        '''RUN STEP'''
+        step_start = time.time()
+        label = f'RUNNING: {step.get("run_all_action")}...'
+        print(label)
+        _prep = await self.acs.run(self._prepare_step, step, ref)
+        if not _prep:
+            return self
+        ref, _conf, api, selected_etlrb = _prep
+        items = self.get_step_items(step, data)
+        semaphore = asyncio.Semaphore(self.get_step_concurrency(step, _conf))
+        async def _run_item(item):
+            async with semaphore:
+                skipped = self.get_checkpoint_log(step, item, ref, selected_etlrb)
+                if skipped is not None:
+                    return [skipped]
+                log, start, payload = await self.acs.run(self._start_item, step, item, ref, _conf, selected_etlrb)
+                if payload is None:
+                    return [log]
+                _aux = await self.acs.api_call(api, {'data': payload})
+                logs = await self.acs.run(self._finish_item, step, log, start, _aux, selected_etlrb)
+                await self.acs.run(self.set_checkpoint, step, item, ref, logs or [log], selected_etlrb)
+                return logs
+        tasks = {
+            i: asyncio.ensure_future(_run_item(items[i]))
+            for i in self.get_item_order(step, items, _conf, selected_etlrb)
+        }
+        for i in range(len(items)): # KEEP THE ORIGINAL ORDER IN THE LOGS
+            await self.acs.run(self.append_logs, await tasks[i])
+        await self.acs.run(self.save_stores)
+        if self.cs.metrics is not None:
+            self.cs.metrics.record_step(step.get("run_all_action"), step_start, time.time())
+        label = f'FINISHING: {step.get("run_all_action")}...'
+        print(label)
+        return self
+    async def run_filtered(self, _filter: str, ref = None):
+        '''IILTERED'''
+        _step = list(filter(lambda s: s.get('run_all_action') == _filter, self.steps))
+        return await self.run_step(_step[0], ref = ref)
+    async def inputs(self, ref = None):
+        '''RUN INPUTS | EXTRACTIONS'''
+        return await self.run_filtered('extract', ref)
+    async def outputs(self, ref = None):
+        '''RUN OUTPUTS | TRANSFORMS'''
+        return await self.run_filtered('transform', ref)
+    async def data_quality(self, ref = None):
+        '''RUN DATA QUALITY'''
+        return await self.run_filtered('data_quality', ref)
+    async def data_reconcilia(self, ref = None):
+        '''RUN DATA RECONCILIATION'''
+        return await self.run_filtered('data_reconcilia', ref)
+    async def export(self, ref = None):
+        '''RUN DATA EXPORT'''
+        return await self.run_filtered('export', ref)
+    async def notify(self, ref = None):
+        '''RUN DATA NOTIFY'''
+        return await self.run_filtered('notify', ref)
+    async def run_all(self, ref = None, dag: bool = False, resume: bool = False):
+        '''RUN ALL, as a dependency graph with dag, skipping the items that already succeeded with resume'''
+        await self.acs.run(self.load_step_data)
+        self._resume = await self.acs.run(self.get_resume_state, ref) if resume else None
+        try:
+            if dag:
+                return await self.run_dag(ref)
+            for step in self.steps:
+                await self.run_step(step, ref = ref)
+        finally:
+            self._resume = None
+            await self.acs.run(self.flush_logs)
+        return self
+    async def run_dag(self, ref = None, max_workers: int = None):
+        '''RUN ALL AS A DEPENDENCY GRAPH, on its own threads off the event loop'''
+        await self.acs.run(super().run_dag, ref, max_workers)
+        return self
+    async def explain(self, ref = None, dag: bool = False, max_workers: int = None) -> dict:
+        '''PREDICTED DURATION OF run_all FOR THE REF, PER STEP AND IN TOTAL'''
+        return await self.acs.run(super().explain, ref, dag, max_workers)
+    async def find_etl_report_base(self, base) -> dict:
+        '''the single ETL / REPORT / BASE with the name or id (or matching the pattern)'''
+        if isinstance(base, dict):
+            return base
+        base = str(base)
+        return self.match_etl_report_base(base, await self.get_etl_report_base(None if base.isdigit() else base))
+    async def run_job(self, base, ref = None, steps: list = None, concurrency: int = None, conf: dict = None, dag: bool = False, resume: bool = False, save_logs: bool = False, plan: bool = False) -> dict:
+        '''get the data and run all for the base / ref, returns {base, ref, success, items, failed, logs}'''
+        base = await self.find_etl_report_base(base)
+        self.set_allow_skip_conf(self.get_run_conf(steps, concurrency, conf))
+        if plan and self.durations is None:
+            self.set_durations()
+        await self.get_data(base, ref = ref)
+        await self.run_all(dag = dag, resume = resume)
+        if save_logs:
+            await self.save_logs()
+        return self.get_job_result(base)
+    def copy_base(self, ref = None):
+        '''new AsyncETLReportBase on the same AsyncInit and conf with a copy of the data and empty logs'''
+        base = super().copy_base(ref)
+        base.acs = self.acs
+        return base
+    async def backfill(self, start, end = None, etl_report_base: dict = None, periodicity = None, width: int = 4, dag: bool = False, resume: bool = False) -> dict:
+        '''RUN ALL FOR EVERY REF FROM start TO end, width refs at once (see ETLReportBase.backfill)'''
+        if etl_report_base:
+            await self.get_data(etl_report_base)
+        if not self.data:
+            raise Exception('Run .get_data first or pass the etl_report_base!')
+        await self.acs.run(self.load_step_data) # ONCE FOR EVERY REF
+        refs = await self.acs.run(self.get_refs, start, end, periodicity)
+        self.backfill_bases = {ref.strftime('%Y-%m-%d'): self.copy_base(ref) for ref in refs}
+        errors, semaphore = {}, asyncio.Semaphore(max(1, width))
+        async def _run(ref, base):
+            async with semaphore:
+                try:
+                    await base.run_all(dag = dag, resume = resume)
+                except Exception as _err:
+                    print(f'BACKFILL ERR: {base.ref}', str(_err))
+                    errors[ref] = str(_err)
+        await asyncio.gather(*[_run(ref, base) for ref, base in self.backfill_bases.items()])
+        return self.get_backfill_matrix(errors)
+    async def save_logs(self):
+        '''SAVE THE LOGS GENERATE DURING THE PROCESSING'''
+        if isinstance(self.log_sink, APILogSink):
+            await self.acs.run(self.log_sink.flush)
+            return self
+        res = await self.acs.create({'table': 'etl_report_base_log', 'data': self.get_logs()})
         print(res.get('msg'))
         return self
+class FairSlots():
+    '''Slots shared by many owners, a freed slot goes to the next waiting owner in turn (round-robin)
+
+    Each owner waits in its own queue (first come first served within it)
+    and the owners take turns, so one with many waiting calls gets a slot
+    as often as one with a single call. handle(owner) is the context
+    manager of an owner.
+    '''
+    def __init__(self, size: int):
+        self.size = size
+        self.used = 0
+        self.waiting = OrderedDict()
+        self.lock = threading.Lock()
+    def acquire(self, owner):
+        '''take a slot, waiting for the turn of the owner when they are all used'''
+        with self.lock:
+            if self.used < self.size and not self.waiting:
+                self.used += 1
+                return self
+            event = threading.Event()
+            self.waiting.setdefault(owner, deque()).append(event)
+        event.wait()
+        return self
+    def release(self):
+        '''free a slot, handed to the first waiting call of the next owner'''
+        with self.lock:
+            if not self.waiting:
+                self.used -= 1
+                return self
+            owner, events = next(iter(self.waiting.items()))
+            del self.waiting[owner]
+            events.popleft().set()
+            if events: # BACK OF THE ROUND
+                self.waiting[owner] = events
+        return self
+    def handle(self, owner):
+        '''context manager taking a slot for the owner'''
+        slots = self
+        class _Slot():
+            def __enter__(self):
+                slots.acquire(owner)
+                return self
+            def __exit__(self, *exc):
+                slots.release()
+        return _Slot()
+class Fleet():
+    '''Run many ETL / REPORT / DATABASE concurrently on one Init
+
+    max_workers bases run at once, each with per_base items in flight (the
+    step concurrency when the conf sets none), and all of them share
+    max_in_flight api slots handed out to the bases in turn, so a base with
+    many items can't starve the others. The bases start by priority, higher
+    first.
+    '''
+    def __init__(self, cs: Init = None, bases = None, max_workers: int = 4, max_in_flight: int = 8, per_base: int = 4, priority = None):
+        self.cs = Init() if not cs else cs
+        self.bases = bases
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+        self.per_base = per_base
+        self.priority = priority
+        self.steps = None
+        self.allow_skip_conf = None
+        self.checkpoints = None
+        self.durations = None
+        self.results = {}
+        self.slots = FairSlots(max_in_flight)
+        if self.cs.pool_maxsize < max_in_flight:
+            self.cs.pool_maxsize = max_in_flight
+    def set_steps(self, steps: list):
+        '''SET THE STEPS OF EVERY BASE'''
+        if steps:
+            self.steps = steps
+        return self
+    def set_checkpoints(self, checkpoints: CheckpointStore):
+        '''SET THE CHECKPOINT STORE OF EVERY BASE'''
+        self.checkpoints = checkpoints
+        return self
+    def set_durations(self, durations: DurationStore = None):
+        '''SET THE DURATION STORE OF EVERY BASE (default the log table)'''
+        self.durations = DurationStore(self.cs) if durations is None else durations
+        return self
+    def set_allow_skip_conf(self, allow_skip_conf: dict):
+        '''SET ALLOW AND SKIP CONFIG OF EVERY BASE'''
+        if allow_skip_conf:
+            self.allow_skip_conf = allow_skip_conf
+        return self
+    def get_bases(self) -> list:
+        '''the report base rows, from the rows, names / ids or patterns given'''
+        bases = self.bases if isinstance(self.bases, list) else [self.bases]
+        rows, _all = [], None
+        for base in bases:
+            if isinstance(base, dict):
+                rows.append(base)
+            elif isinstance(base, int):
+                if _all is None:
+                    _all = ETLReportBase(self.cs).get_etl_report_base() or []
+                rows.extend([r for r in _all if r.get('etl_report_base_id') == base])
+            else:
+                rows.extend(ETLReportBase(self.cs).get_etl_report_base(pattern = base) or [])
+        return rows
+    def get_priority(self, base: dict):
+        '''priority of the base, from the priority callable or {name | id: priority}'''
+        if callable(self.priority):
+            return self.priority(base)
+        if isinstance(self.priority, dict):
+            return self.priority.get(
+                base.get('etl_report_base'),
+                self.priority.get(base.get('etl_report_base_id', base.get('id')), 0)
+            )
+        return 0
+    def get_run_conf(self, etl: ETLReportBase) -> dict:
+        '''allow_skip_conf of the base, per_base items at once in the steps with no concurrency set'''
+        conf = copy.deepcopy(self.allow_skip_conf or etl.allow_skip_conf)
+        for step in etl.steps:
+            _conf = conf.setdefault(step.get('run_all_action'), {})
+            if not _conf.get('concurrency') and not step.get('concurrency'):
+                _conf['concurrency'] = self.per_base
+        return conf
+    def run_base(self, base: dict, ref = None, dag: bool = False, resume: bool = False) -> dict:
+        '''get the data and run all for a single base'''
+        name = base.get('etl_report_base', base.get('name'))
+        start = time.time()
+        etl = ETLReportBase(self.cs, self.steps)
+        etl.max_in_flight = self.per_base
+        etl.slots = self.slots.handle(name)
+        etl.set_allow_skip_conf(self.get_run_conf(etl))
+        try:
+            etl.set_checkpoints(self.checkpoints)
+            if self.durations is not None:
+                etl.set_durations(self.durations)
+            etl.get_data(base, ref = ref).run_all(dag = dag, resume = resume)
+            logs = etl.get_logs() or []
+            return {
+                'name': name,
+                'success': all(etl.is_node_success([log]) for log in logs),
+                'msg': None,
+                'timer': etl.get_timer(start, time.time()),
+                'etl': etl
+            }
+        except Exception as _err:
+            return {
+                'name': name,
+                'success': False,
+                'msg': str(_err),
+                'timer': etl.get_timer(start, time.time()),
+                'etl': etl
+            }
+    def run(self, ref = None, dag: bool = False, resume: bool = False):
+        '''RUN ALL THE BASES'''
+        bases = sorted(self.get_bases(), key = self.get_priority, reverse = True)
+        print(f'RUNNING: fleet of {len(bases)}...')
+        with ThreadPoolExecutor(max_workers = max(1, self.max_workers)) as executor:
+            futures = [executor.submit(self.run_base, base, ref, dag, resume) for base in bases]
+            for future in futures:
+                res = future.result()
+                self.results[res['name']] = res
+        print('FINISHING: fleet...')
+        return self
+class Worker():
+    '''Resident worker running ETL / REPORT / BASE jobs on a warm Init
+
+    The jobs ({"base", "ref", "steps", "concurrency", "conf", "dag",
+    "resume", "save_logs"}) are submitted over a localhost HTTP port or a
+    Unix socket (POST /jobs) into a queue of at most max_queue jobs (429
+    when full), run by max_workers threads on the same logged in Init and
+    metadata cache, and their status and logs are kept (the last max_jobs)
+    for GET /jobs/{id}. There is no authentication, bind it to localhost or
+    a socket only the scheduler can reach.
+    '''
+    def __init__(self, cs: Init = None, max_workers: int = 4, max_queue: int = 100, max_jobs: int = 1000, steps: list = None, etl_cache_ttl: float = 60):
+        self.cs = Init() if not cs else cs
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.steps = steps
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self._queue = queue.Queue(maxsize = max_queue)
+        self._threads = []
+        self.server = None
+        if self.cs.cache is None:
+            self.cs.set_cache()
+        if self.cs.etl_cache_ttl is None: # THE REPORT BASES ARE EDITED IN THE UI, KEEP THEM FRESH
+            self.cs.etl_cache_ttl = etl_cache_ttl
+    def start(self):
+        '''start the worker threads'''
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target = self._worker, daemon = True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+    def submit(self, job: dict) -> dict:
+        '''queue the job, returns its status, raises queue.Full when the queue is full'''
+        if not job or not job.get('base'):
+            raise Exception('The job needs a base!')
+        job = {
+            **job,
+            'id': os.urandom(8).hex(),
+            'status': 'queued',
+            'submitted': datetime.datetime.now().isoformat()
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+            while len(self.jobs) > self.max_jobs:
+                _id = next((k for k, v in self.jobs.items() if v['status'] in ['done', 'failed']), None)
+                if _id is None:
+                    break
+                del self.jobs[_id]
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job['id']]
+            raise
+        return self.get_job(job['id'], logs = False)
+    def get_job(self, job_id: str, logs: bool = True) -> dict:
+        '''the job status (and logs), None when unknown'''
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {k: v for k, v in job.items() if logs or k != 'logs'}
+    def get_jobs(self) -> list:
+        '''status of every job kept, without the logs'''
+        with self.lock:
+            return [{k: v for k, v in job.items() if k != 'logs'} for job in self.jobs.values()]
+    def get_health(self) -> dict:
+        with self.lock:
+            running = len([job for job in self.jobs.values() if job['status'] == 'running'])
+        return {'success': True, 'queued': self._queue.qsize(), 'running': running, 'workers': len(self._threads)}
+    def run_job(self, job: dict):
+        '''run the job on a new ETLReportBase over the shared Init'''
+        start = time.time()
+        with self.lock:
+            job.update(status = 'running', started = datetime.datetime.now().isoformat())
+        etl = ETLReportBase(self.cs, self.steps)
+        try:
+            res = etl.run_job(
+                job['base'], job.get('ref'), job.get('steps'), job.get('concurrency'), job.get('conf'),
+                bool(job.get('dag')), bool(job.get('resume')), bool(job.get('save_logs')), bool(job.get('plan'))
+            )
+            status, msg = 'done', None
+        except Exception as _err:
+            res, status, msg = {'success': False}, 'failed', str(_err)
+        with self.lock:
+            job.update(res)
+            job.update(
+                status = status, msg = msg,
+                finished = datetime.datetime.now().isoformat(),
+                timer = etl.get_timer(start, time.time())
+            )
+        return job
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self.run_job(job)
+    def serve(self, host: str = '127.0.0.1', port: int = 8766, socket_path: str = None):
+        '''serve the jobs api on host:port or the Unix socket (blocks until close)'''
+        import http.server
+        import socketserver
+        worker = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            def log_message(self, *args):
+                pass
+            def address_string(self):
+                return str(self.client_address)
+            def reply(self, status: int, res):
+                body = json.dumps(res, default = json_default).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                if path == '/health':
+                    return self.reply(200, worker.get_health())
+                if path == '/jobs':
+                    return self.reply(200, {'success': True, 'data': worker.get_jobs()})
+                if path.startswith('/jobs/'):
+                    job = worker.get_job(path[len('/jobs/'):], logs = 'logs=0' not in query)
+                    if job is None:
+                        return self.reply(404, {'success': False, 'msg': 'Unknown job'})
+                    return self.reply(200, {'success': True, 'data': job})
+                return self.reply(404, {'success': False, 'msg': f'Unknown path {path}'})
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.partition('?')[0] != '/jobs':
+                    return self.reply(404, {'success': False, 'msg': f'Unknown path {self.path}'})
+                try:
+                    job = worker.submit(json.loads(body or b'{}'))
+                except queue.Full:
+                    return self.reply(429, {'success': False, 'msg': 'The job queue is full'})
+                except Exception as _err:
+                    return self.reply(400, {'success': False, 'msg': str(_err)})
+                return self.reply(202, {'success': True, 'data': job})
+        self.start()
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+                daemon_threads = True
+            self.server = Server(socket_path, Handler)
+            os.chmod(socket_path, 0o600)
+        else:
+            self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+            self.server.daemon_threads = True
+        print(f'SERVING: {socket_path or f"http://{host}:{self.server.server_address[1]}"}', flush = True)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.remove(socket_path)
+        return self
+    def close(self):
+        '''stop serving and the worker threads once the queued jobs ran'''
+        if self.server is not None:
+            self.server.shutdown()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        return self
+class WorkerClient():
+    '''Client of a Worker, over http://host:port or a Unix socket path, standard library only'''
+    def __init__(self, url: str = 'http://127.0.0.1:8766', timeout: float = 60):
+        self.url = url
+        self.timeout = timeout
+    def get_connection(self):
+        import http.client
+        import socket
+        if not self.url.startswith('http'):
+            path, timeout = self.url, self.timeout
+            class UnixConnection(http.client.HTTPConnection):
+                def connect(self):
+                    self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self.sock.settimeout(timeout)
+                    self.sock.connect(path)
+            return UnixConnection('localhost', timeout = timeout)
+        _url = urlsplit(self.url)
+        return http.client.HTTPConnection(_url.hostname, _url.port or 80, timeout = self.timeout)
+    def request(self, method: str, path: str, payload: dict = None) -> dict:
+        conn = self.get_connection()
+        try:
+            body = json.dumps(payload, default = json_default) if payload is not None else None
+            conn.request(method, path, body = body, headers = {'Content-Type': 'application/json'})
+            return json.loads(conn.getresponse().read() or b'{}')
+        finally:
+            conn.close()
+    def submit(self, job: dict, wait: bool = False, poll: float = 0.5, timeout: float = None) -> dict:
+        '''submit the job, with wait poll until it is done / failed, returns the job'''
+        res = self.request('POST', '/jobs', job)
+        if not res.get('success') or not wait:
+            return res
+        start = time.time()
+        while True:
+            job = self.get_job(res['data']['id'])
+            if job.get('data', {}).get('status') in ['done', 'failed']:
+                return job
+            if timeout and time.time() - start > timeout:
+                return job
+            time.sleep(poll)
+    def get_job(self, job_id: str, logs: bool = True) -> dict:
+        return self.request('GET', f'/jobs/{job_id}' + ('' if logs else '?logs=0'))
+    def get_jobs(self) -> dict:
+        return self.request('GET', '/jobs')
+def get_cli_parser():
+    '''the central-set command line'''
+    import argparse
+    cli = argparse.ArgumentParser(prog = 'central-set', description = 'Central Set command line')
+    cli.add_argument('--host', default = os.environ.get('CS_HOST'), help = 'Central Set url, or CS_HOST (comma separated for a host pool)')
+    cli.add_argument('--user', default = None, help = 'or CS_USER')
+    cli.add_argument('--password', default = None, help = 'or CS_PASS')
+    cli.add_argument('--app', default = None)
+    cli.add_argument('--lang', default = 'en')
+    cli.add_argument('--no-cache', action = 'store_true', help = 'no token / metadata cache on disk')
+    cli.add_argument('--refresh', action = 'store_true', help = 'drop the cached apps / tables first')
+    cli.add_argument('--etl-cache-ttl', type = float, default = 0, help = 'seconds the report bases are cached, default 0 (always read)')
+    commands = cli.add_subparsers(dest = 'command')
+    run = commands.add_parser('run', help = 'run an ETL / REPORT / BASE')
+    run.add_argument('base', help = 'etl_report_base name, id or pattern')
+    run.add_argument('--ref', default = None, help = 'date ref, default yesterday')
+    run.add_argument('--steps', default = None, help = 'comma separated actions to run, default all')
+    run.add_argument('--concurrency', type = int, default = None, help = 'items of a step run at once')
+    run.add_argument('--dag', action = 'store_true', help = 'run as a dependency graph')
+    run.add_argument('--resume', action = 'store_true', help = 'skip the items that already succeeded')
+    run.add_argument('--conf', default = None, help = 'allow_skip_conf json, or @file')
+    run.add_argument('--save-logs', action = 'store_true', help = 'save the logs in etl_report_base_log')
+    run.add_argument('--plan', action = 'store_true', help = 'start the items expected to take longest first')
+    explain = commands.add_parser('explain', help = 'predicted duration of a run, from the past runs')
+    explain.add_argument('base', help = 'etl_report_base name, id or pattern')
+    explain.add_argument('--ref', default = None, help = 'date ref, default yesterday')
+    explain.add_argument('--steps', default = None, help = 'comma separated actions to run, default all')
+    explain.add_argument('--concurrency', type = int, default = None, help = 'items of a step run at once')
+    explain.add_argument('--dag', action = 'store_true', help = 'run as a dependency graph')
+    explain.add_argument('--conf', default = None, help = 'allow_skip_conf json, or @file')
+    read = commands.add_parser('read', help = 'read a table')
+    read.add_argument('table')
+    read.add_argument('--fields', default = None, help = 'comma separated')
+    read.add_argument('--filter', action = 'append', default = [], help = 'field=value, repeatable')
+    read.add_argument('--limit', type = int, default = -1)
+    read.add_argument('--offset', type = int, default = 0)
+    read.add_argument('--page-size', type = int, default = 10000)
+    read.add_argument('--format', choices = ['ndjson', 'json', 'csv'], default = 'ndjson')
+    create = commands.add_parser('create', help = 'create rows in a table')
+    create.add_argument('table')
+    create.add_argument('data', help = 'json object / list, @file or - for stdin')
+    create.add_argument('--chunk-size', type = int, default = 1000)
+    create.add_argument('--workers', type = int, default = 4)
+    upload = commands.add_parser('upload', help = 'upload files')
+    upload.add_argument('files', nargs = '+')
+    upload.add_argument('--payload', default = None, help = 'json form fields')
+    upload.add_argument('--stream', action = 'store_true', help = 'chunked / resumable upload, the server must assemble the parts')
+    serve = commands.add_parser('serve', help = 'run a resident worker taking jobs over http / a Unix socket')
+    serve.add_argument('--port', type = int, default = 8766, help = 'localhost port')
+    serve.add_argument('--socket', default = None, help = 'Unix socket path instead of the port')
+    serve.add_argument('--workers', type = int, default = 4)
+    serve.add_argument('--max-queue', type = int, default = 100)
+    submit = commands.add_parser('submit', help = 'submit a run job to a worker')
+    submit.add_argument('base', help = 'etl_report_base name or id')
+    submit.add_argument('--ref', default = None)
+    submit.add_argument('--steps', default = None, help = 'comma separated actions to run, default all')
+    submit.add_argument('--concurrency', type = int, default = None)
+    submit.add_argument('--dag', action = 'store_true')
+    submit.add_argument('--resume', action = 'store_true')
+    submit.add_argument('--conf', default = None, help = 'allow_skip_conf json, or @file')
+    submit.add_argument('--save-logs', action = 'store_true')
+    submit.add_argument('--plan', action = 'store_true')
+    submit.add_argument('--worker', default = None, help = 'worker url or Unix socket, default http://127.0.0.1:8766')
+    submit.add_argument('--wait', action = 'store_true', help = 'wait for the job and print its logs')
+    return cli
+def read_json_arg(value: str):
+    '''json from the argument, @file or - for stdin'''
+    if value is None:
+        return None
+    if value == '-':
+        return json.load(sys.stdin)
+    if value.startswith('@'):
+        with open(value[1:], 'r', encoding = 'utf-8') as _file:
+            return json.load(_file)
+    return json.loads(value)
+def cli_connect(args) -> Init:
+    '''Init logged in for the command line, with the token / apps and tables cache on disk'''
+    host = args.host or 'localhost'
+    cs = CentralSet(host = host.split(',') if ',' in host else host, user = args.user, password = args.password).connect()
+    cs.set_lang(args.lang)
+    cs.etl_cache_ttl = args.etl_cache_ttl
+    if not args.no_cache:
+        cs.set_token_cache().set_cache(path = True)
+        if args.refresh:
+            cs.invalidate()
+    cs.login().get_apps() # FROM THE CACHE ON DISK AFTER THE FIRST COMMAND
+    if args.app:
+        cs.set_app(args.app)
+    return cs
+def cli_run(cs: Init, args) -> int:
+    res = ETLReportBase(cs).run_job(
+        args.base, args.ref, args.steps.split(',') if args.steps else None, args.concurrency,
+        read_json_arg(args.conf), args.dag, args.resume, args.save_logs, args.plan
+    )
+    res.pop('logs')
+    print(json.dumps(res, default = json_default), file = args.out)
+    return 0 if res['success'] else 1
+def cli_explain(cs: Init, args) -> int:
+    etl = ETLReportBase(cs)
+    base = etl.find_etl_report_base(args.base)
+    etl.set_allow_skip_conf(etl.get_run_conf(args.steps.split(',') if args.steps else None, args.concurrency, read_json_arg(args.conf)))
+    res = etl.get_data(base, ref = args.ref).explain(dag = args.dag)
+    print(json.dumps(res, default = json_default), file = args.out)
+    return 0
+def cli_read(cs: Init, args) -> int:
+    params = {
+        'table': args.table,
+        'limit': args.limit,
+        'offset': args.offset,
+        'join': 'none',
+        'fields': args.fields.split(',') if args.fields else None,
+        'filters': [
+            {'field': f.split('=', 1)[0], 'cond': '=', 'value': f.split('=', 1)[1]}
+            for f in args.filter
+        ] or None
+    }
+    if args.limit and args.limit > 0:
+        res = cs.read_params(params).read()
+        if not res.get('success'):
+            raise Exception(res.get('msg', res.get('message')))
+        rows = iter(res.get('data') or [])
+    else:
+        rows = cs.read_iter(params, page_size = args.page_size)
+    out = args.out
+    if args.format == 'json':
+        json.dump(list(rows), out, default = json_default)
+        out.write('\n')
+    elif args.format == 'csv':
+        import csv
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(out, fieldnames = list(row), extrasaction = 'ignore')
+                writer.writeheader()
+            writer.writerow(row)
+    else:
+        for row in rows:
+            out.write(json.dumps(row, default = json_default) + '\n')
+    return 0
+def cli_create(cs: Init, args) -> int:
+    data = read_json_arg(args.data)
+    res = cs.bulk_create(args.table, data if isinstance(data, list) else [data], chunk_size = args.chunk_size, max_workers = args.workers)
+    res = {k: v for k, v in res.items() if k != 'chunks'}
+    print(json.dumps(res, default = json_default), file = args.out)
+    return 0 if res.get('success') else 1
+def cli_upload(cs: Init, args) -> int:
+    payload = read_json_arg(args.payload) or {}
+    res = cs.upload_many(payload, args.files, stream = args.stream)
+    print(json.dumps(res, default = json_default), file = args.out)
+    return 0 if all(r.get('success') is not False for r in res.values()) else 1
+def cli_serve(cs: Init, args) -> int:
+    import signal
+    def _stop(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _stop)
+    worker = Worker(cs, max_workers = args.workers, max_queue = args.max_queue)
+    try:
+        worker.serve(port = args.port, socket_path = args.socket)
+    except KeyboardInterrupt:
+        pass
+    return 0
+def cli_submit(args) -> int:
+    job = {
+        'base': args.base,
+        'ref': args.ref,
+        'steps': args.steps.split(',') if args.steps else None,
+        'concurrency': args.concurrency,
+        'conf': read_json_arg(args.conf),
+        'dag': args.dag,
+        'resume': args.resume,
+        'save_logs': args.save_logs,
+        'plan': args.plan
+    }
+    res = WorkerClient(args.worker or 'http://127.0.0.1:8766').submit(job, wait = args.wait)
+    print(json.dumps(res, default = json_default), file = args.out)
+    if not res.get('success'):
+        return 1
+    return 0 if not args.wait or res['data'].get('success') else 1
+def main(argv: list = None) -> int:
+    '''central-set run | explain | read | create | upload | serve | submit'''
+    load_env()
+    args = get_cli_parser().parse_args(argv)
+    if not args.command:
+        get_cli_parser().print_help()
+        return 2
+    args.out = sys.stdout # ONLY THE RESULT, THE PROGRESS LINES GO TO STDERR SO THE OUTPUT PIPES TO jq
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.command == 'submit': # NO LOGIN, THE WORKER HAS IT
+                return cli_submit(args)
+            with cli_connect(args) as cs:
+                commands = {
+                    'run': cli_run, 'explain': cli_explain, 'read': cli_read, 'create': cli_create, 'upload': cli_upload, 'serve': cli_serve
+                }
+                return commands[args.command](cs, args)
+    except Exception as _err:
+        print(f'ERR: {str(_err)}', file = sys.stderr)
+        return 1
+if __name__ == '__main__':
+    sys.exit(main())
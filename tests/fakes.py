@@ -0,0 +1,37 @@
+'''Fakes shared by the tests: an ETLReportBase on a plain dict data and a fake api_call'''
+import os
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from central_set_cli import Init, ETLReportBase
+def get_etl(inputs: list, outputs: list, notify: list = None, fail: list = None, delays: dict = None) -> ETLReportBase:
+    '''ETLReportBase on a plain dict data, the api_call answers per item name, the calls made in etl.calls'''
+    cs = Init(host = 'http://x')
+    etl = ETLReportBase(cs)
+    etl.calls = []
+    lock = threading.Lock()
+    def api_call(api: str, payload: dict):
+        step = payload['data']['step']
+        name = payload['data']['data'].get(step.get('name', step.get('table')))
+        time.sleep((delays or {}).get(name, 0))
+        with lock:
+            etl.calls.append(name)
+        if name in (fail or []):
+            return {'success': False, 'msg': f'{name} failed'}
+        return {'success': True, 'msg': f'{name} done'}
+    cs.api_call = api_call
+    etl.data = get_data(inputs, outputs, notify)
+    return etl
+def get_data(inputs: list, outputs: list, notify: list = None, base: dict = None) -> dict:
+    '''plain dict data of a report base with the inputs, outputs (rows) and notify subjects'''
+    return {
+        'etl_report_base': {'data': [base or {'etl_report_base_id': 1, 'etl_report_base': 'TEST'}]},
+        'etl_rbase_input': {'data': [{'etl_rbase_input': i, 'etl_rbase_input_conf': '{}'} for i in inputs]},
+        'etl_rbase_output': {'data': outputs},
+        'etl_rbase_quality': {'data': []},
+        'etl_rb_reconcilia': {'data': []},
+        'etl_rbase_export': {'data': []},
+        'etl_rbase_notify': {'data': [{'notify_subject': n} for n in notify or []]},
+        'etl_report_base_log': {'data': []}
+    }
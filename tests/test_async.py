@@ -0,0 +1,31 @@
+'''Tests of AsyncInit: bounded calls on the executor, reusable across event loops'''
+import asyncio
+import threading
+import time
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init, AsyncInit
+def get_acs(max_concurrency: int) -> AsyncInit:
+    '''AsyncInit on a fake api_call, the most calls seen at once in acs.peak'''
+    cs = Init(host = 'http://x')
+    acs = AsyncInit(cs, max_concurrency = max_concurrency)
+    acs.peak, running, lock = 0, [0], threading.Lock()
+    def api_call(api: str, payload: dict):
+        with lock:
+            running[0] += 1
+            acs.peak = max(acs.peak, running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return {'success': True}
+    cs.api_call = api_call
+    return acs
+async def call_many(acs: AsyncInit, n: int) -> list:
+    return await asyncio.gather(*[acs.api_call('http://x/dyn_api/crud/read', {}) for _ in range(n)])
+def test_calls_are_bounded():
+    acs = get_acs(2)
+    assert len(asyncio.run(call_many(acs, 6))) == 6
+    assert acs.peak == 2
+def test_reused_across_event_loops():
+    acs = get_acs(1)
+    assert len(asyncio.run(call_many(acs, 3))) == 3
+    assert len(asyncio.run(call_many(acs, 3))) == 3
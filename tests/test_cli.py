@@ -0,0 +1,40 @@
+'''Tests of the command line: only the result on stdout, the apps loaded on every command'''
+import json
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init, ETLReportBase, main
+def fake_server(monkeypatch) -> list:
+    '''fake login and apps api, the apis called in the list returned'''
+    calls = []
+    def api_call(self, api: str, payload: dict):
+        calls.append(api.split('/dyn_api/')[1])
+        if api.endswith('/login/login'):
+            return {'success': True, 'token': 't'}
+        if api.endswith('/admin/apps'):
+            return {'success': True, 'data': [{'app_id': 1, 'app': 'ADMIN'}, {'app_id': 2, 'app': 'SALES'}]}
+        return {'success': False, 'message': f'Unexpected {api}'}
+    monkeypatch.setattr(Init, 'api_call', api_call)
+    return calls
+ARGS = ['--host', 'http://x', '--user', 'u', '--password', 'p', '--no-cache']
+def test_run_prints_only_the_result_on_stdout(monkeypatch, capsys):
+    fake_server(monkeypatch)
+    def run_job(self, base, *args, **kwargs):
+        print(f'RUNNING: {base}...')
+        print(f'FINISHING: {base}...')
+        return {'success': True, 'msg': 'done', 'logs': []}
+    monkeypatch.setattr(ETLReportBase, 'run_job', run_job)
+    assert main(ARGS + ['run', 'MY_BASE']) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == {'success': True, 'msg': 'done'}
+    assert 'RUNNING: MY_BASE...' in err and 'FINISHING: MY_BASE...' in err
+def test_apps_are_loaded_without_app(monkeypatch):
+    calls = fake_server(monkeypatch)
+    captured = {}
+    def cli_read(cs, args):
+        captured['app'] = cs.app['app']
+        return 0
+    monkeypatch.setattr('central_set_cli.cli_read', cli_read)
+    assert main(ARGS + ['read', 'app']) == 0
+    assert calls == ['login/login', 'admin/apps']
+    assert captured['app'] == 'ADMIN'
+    assert main(ARGS + ['--app', 'SALES', 'read', 'app']) == 0
+    assert captured['app'] == 'SALES'
@@ -0,0 +1,51 @@
+'''Tests of the Fleet shared slots: round-robin over the bases, one large base can't starve the small ones'''
+import threading
+import time
+from fakes import get_data
+from central_set_cli import Init, ETLReportBase, Fleet, FairSlots
+def test_fair_slots_take_turns():
+    slots = FairSlots(1)
+    slots.acquire('big')
+    order, threads = [], []
+    def _run(owner, i):
+        with slots.handle(owner):
+            order.append(f'{owner}{i}')
+    for owner, n in [('big', 3), ('a', 2), ('b', 1)]:
+        for i in range(n):
+            threads.append(threading.Thread(target = _run, args = (owner, i)))
+            threads[-1].start()
+            time.sleep(0.02) # WAITING IN THIS ORDER
+    slots.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['big0', 'a0', 'b0', 'big1', 'a1', 'big2']
+    assert slots.used == 0 and not slots.waiting
+def test_fleet_defaults_bind():
+    fleet = Fleet(Init(host = 'http://x'))
+    assert fleet.max_workers * fleet.per_base > fleet.max_in_flight
+def test_large_base_does_not_starve_the_small_ones(monkeypatch):
+    bases = {
+        'BIG': get_data([f'big{i}' for i in range(40)], [], base = {'etl_report_base_id': 1, 'etl_report_base': 'BIG'}),
+        'S1': get_data(['s1_in'], [{'etl_rbase_output': 's1_out'}], ['s1_notify'], base = {'etl_report_base_id': 2, 'etl_report_base': 'S1'}),
+        'S2': get_data(['s2_in'], [{'etl_rbase_output': 's2_out'}], ['s2_notify'], base = {'etl_report_base_id': 3, 'etl_report_base': 'S2'})
+    }
+    def get_data_(self, etl_report_base: dict, *args, **kwargs):
+        self.data = bases[etl_report_base['etl_report_base']]
+        return self
+    monkeypatch.setattr(ETLReportBase, 'get_data', get_data_)
+    cs = Init(host = 'http://x')
+    calls, lock = [], threading.Lock()
+    def api_call(api: str, payload: dict):
+        time.sleep(0.02)
+        with lock:
+            calls.append(payload['data']['selected_etlrb']['etl_report_base'])
+        return {'success': True, 'msg': 'ok'}
+    cs.api_call = api_call
+    fleet = Fleet(
+        cs, bases = [{'etl_report_base': name} for name in bases],
+        max_workers = 3, max_in_flight = 2, per_base = 8, priority = {'BIG': 10}
+    ).run()
+    assert all(res['success'] for res in fleet.results.values())
+    assert len(calls) == 46
+    last_small = max(i for i, name in enumerate(calls) if name != 'BIG')
+    assert last_small < 12, calls # IN TURNS, NOT BEHIND THE QUEUE OF BIG ITEMS
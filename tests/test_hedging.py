@@ -0,0 +1,58 @@
+'''Tests of the hedged requests: the call on the calling thread, bounded hedges, hedges to another node'''
+import json
+import threading
+import time
+import requests
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init
+def get_response(status: int, res: dict) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(res).encode('utf-8')
+    r.headers['Content-Type'] = 'application/json'
+    return r
+def get_cs(hosts: dict, max_hedges: int = 4) -> Init:
+    '''Init on fake hosts {host: (seconds, status)}, the posts (host, thread) in cs.posts'''
+    cs = Init(host = list(hosts)[0], token = 't')
+    if len(hosts) > 1:
+        cs.set_hosts(list(hosts), check_interval = 0)
+        for node in cs.hosts.nodes:
+            node['token'] = 't'
+    cs.policy.max_hedges = max_hedges
+    cs.policy.retries = 0
+    for _ in range(cs.policy.hedge_min_samples):
+        cs.policy.observe(f'{cs.host}/dyn_api/crud/read', 0.05)
+    cs.posts, lock = [], threading.Lock()
+    def _post(api: str, data, headers: dict) -> requests.Response:
+        host = api.split('/dyn_api')[0]
+        with lock:
+            cs.posts.append((host, threading.current_thread()))
+        seconds, status = hosts[host]
+        time.sleep(seconds)
+        return get_response(status, {'success': status == 200, 'host': host})
+    cs._post = _post
+    return cs
+def read(cs: Init) -> dict:
+    return cs.api_call(f'{cs.host}/dyn_api/crud/read', {'data': {'table': 'x'}})
+def test_the_call_runs_on_the_calling_thread():
+    cs = get_cs({'http://a': (0.01, 200)})
+    assert read(cs)['host'] == 'http://a'
+    assert cs.posts == [('http://a', threading.current_thread())]
+def test_a_slow_failing_node_is_hedged_on_another_node():
+    cs = get_cs({'http://a': (0.3, 503), 'http://b': (0.01, 200)})
+    cs.hosts.pick = lambda exclude = None, pick = cs.hosts.pick: pick(exclude or cs.hosts.nodes[1])
+    res = read(cs)
+    assert res['host'] == 'http://b'
+    assert [host for host, _ in cs.posts] == ['http://a', 'http://b']
+    assert cs.posts[0][1] is threading.current_thread()
+    assert [node['outstanding'] for node in cs.hosts.nodes] == [0, 0]
+def test_hedges_in_flight_are_bounded():
+    cs = get_cs({'http://a': (0.3, 200)}, max_hedges = 1)
+    threads = [threading.Thread(target = read, args = (cs, )) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    time.sleep(0.3) # THE HEDGE ENDS AFTER THE CALL IT DUPLICATES
+    assert len(cs.posts) == 5 # 4 CALLS AND 1 HEDGE
+    assert cs.policy.hedges == 0
@@ -0,0 +1,67 @@
+'''Tests of the host pool: weighted picks, failover from a dead node, the outstanding counts after errors'''
+import json
+import threading
+import time
+import requests
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init, HostPool
+def get_response(status: int, res: dict) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(res).encode('utf-8')
+    r.headers['Content-Type'] = 'application/json'
+    return r
+def get_cs(hosts: dict, answers: dict, **kwargs) -> Init:
+    '''Init on a host pool of fake nodes, answers {host: status or exception}, the hosts posted to in cs.posts'''
+    cs = Init(host = list(hosts)[0], token = 't')
+    cs.set_hosts(hosts, check_interval = 0, **kwargs)
+    for node in cs.hosts.nodes:
+        node['token'] = 't'
+    cs.policy.backoff = 0.01
+    cs.posts, lock = [], threading.Lock()
+    def _post(api: str, data, headers: dict) -> requests.Response:
+        host = api.split('/dyn_api')[0]
+        with lock:
+            cs.posts.append(host)
+        time.sleep(0.005)
+        answer = answers[host]
+        if isinstance(answer, Exception):
+            raise answer
+        return get_response(answer, {'success': answer == 200, 'host': host})
+    cs._post = _post
+    return cs
+def read(cs: Init) -> dict:
+    return cs.api_call(f'{cs.host}/dyn_api/crud/read', {'data': {'table': 'x'}})
+def test_weighted_pick():
+    pool = HostPool({'http://a': 3, 'http://b': 1}, strategy = 'weighted', check_interval = 0)
+    for _ in range(4000):
+        pool.release(pool.pick())
+    share = pool.nodes[0]['requests'] / 4000
+    assert 0.7 < share < 0.8
+def test_least_outstanding_per_weight():
+    pool = HostPool({'http://a': 3, 'http://b': 1}, check_interval = 0)
+    for _ in range(40):
+        pool.pick() # HELD, NOT RELEASED
+    assert 29 <= pool.nodes[0]['outstanding'] <= 31
+    assert sum(node['outstanding'] for node in pool.nodes) == 40
+def test_failover_from_a_dead_node():
+    cs = get_cs({'http://a': 1, 'http://b': 1}, {'http://a': requests.ConnectionError('refused'), 'http://b': 200}, max_failures = 1, cooldown = 60)
+    cs.hosts.nodes[1]['outstanding'] = 1 # b BUSY, THE FIRST CALL GOES TO a
+    assert read(cs)['host'] == 'http://b'
+    cs.hosts.nodes[1]['outstanding'] -= 1
+    assert cs.posts == ['http://a', 'http://b']
+    assert not cs.hosts.is_healthy(cs.hosts.nodes[0])
+    assert all(read(cs)['host'] == 'http://b' for _ in range(10))
+    assert cs.posts.count('http://a') == 1
+def test_outstanding_back_to_zero_after_errors():
+    answers = {'http://a': requests.ConnectionError('refused'), 'http://b': 503, 'http://c': ValueError('broken'), 'http://d': 200}
+    cs = get_cs({host: 1 for host in answers}, answers, max_failures = 100)
+    cs.policy.retries = 1
+    threads = [threading.Thread(target = read, args = (cs, )) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert set(cs.posts) == set(answers)
+    assert [node['outstanding'] for node in cs.hosts.nodes] == [0, 0, 0, 0]
+    assert sum(node['requests'] for node in cs.hosts.nodes) == len(cs.posts)
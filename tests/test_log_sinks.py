@@ -0,0 +1,79 @@
+'''Tests of the log sinks: each run reads back only its own logs, the queued logs are written at exit'''
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from fakes import get_etl
+from central_set_cli import APILogSink, NDJSONLogSink, SQLiteLogSink
+def get_api_sink() -> APILogSink:
+    '''APILogSink on a fake table, the rows keep their etl_report_base_log_id'''
+    etl = get_etl([], [])
+    rows = []
+    def bulk_create(table: str, logs: list, **kwargs):
+        inserted = []
+        for log in logs:
+            rows.append({**log, f'{table}_id': len(rows) + 1})
+            inserted.append(len(rows))
+        return {'success': True, 'inserted': inserted, 'failed': [], 'chunks': []}
+    def read_iter(params: dict):
+        for row in rows:
+            if all(
+                str(row.get(f['field'])) >= str(f['value']) if f['cond'] == '>=' else row.get(f['field']) == f['value']
+                for f in params['filters']
+            ):
+                yield row
+    etl.cs.bulk_create = bulk_create
+    etl.cs.read_iter = read_iter
+    sink = APILogSink(etl.cs, flush_interval = 60)
+    sink.rows = rows
+    return sink
+@pytest.fixture(params = ['api', 'ndjson', 'sqlite'])
+def sink(request, tmp_path):
+    if request.param == 'api':
+        _sink = get_api_sink()
+    elif request.param == 'ndjson':
+        _sink = NDJSONLogSink(str(tmp_path / 'logs.ndjson'), flush_interval = 60)
+    else:
+        _sink = SQLiteLogSink(str(tmp_path / 'logs.db'), flush_interval = 60)
+    yield _sink
+    _sink.close()
+def run(sink, fail: list = None):
+    etl = get_etl(['a', 'b'], [{'etl_rbase_output': 'x'}], notify = ['n'], fail = fail)
+    return etl.set_log_sink(sink).run_all()
+def test_rerun_reads_only_its_own_logs(sink):
+    first = run(sink)
+    second = run(sink, fail = ['a'])
+    assert len(first.get_logs()) == 4
+    assert len(second.get_logs()) == 4
+    assert [log.get('success') for log in first.get_logs()] == [True, True, True, True]
+    assert [log.get('success') for log in second.get_logs()] == [False, True, True, True]
+    assert len(sink.read()) == 8
+def test_run_all_flushes_the_sink(sink):
+    etl = run(sink)
+    sink.write([{'name': 'late'}]) # NOT FLUSHED, IT WAITS FOR THE flush_interval
+    assert [log.get('name') for log in sink.read(etl._log_run)] == ['a', 'b', 'x', 'n']
+def test_notify_gets_the_logs_of_the_run(sink):
+    run(sink)
+    etl = get_etl(['a'], [], notify = ['n'])
+    calls = []
+    api_call = etl.cs.api_call
+    def _api_call(api: str, payload: dict):
+        if api.endswith('/notify'):
+            calls.append(payload['data']['db_data']['etl_report_base_log']['data'])
+        return api_call(api, payload)
+    etl.cs.api_call = _api_call
+    etl.set_log_sink(sink).run_all()
+    assert [log.get('name') for log in calls[0]] == ['a']
+def test_queued_logs_are_written_at_exit(tmp_path):
+    path = str(tmp_path / 'logs.ndjson')
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    code = textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {src!r})
+        from central_set_cli import NDJSONLogSink
+        NDJSONLogSink({path!r}, flush_interval = 60).write([{{'name': i}} for i in range(9)])
+    ''')
+    subprocess.run([sys.executable, '-c', code], check = True, timeout = 60)
+    with open(path, 'r', encoding = 'utf-8') as _file:
+        assert len(_file.readlines()) == 9
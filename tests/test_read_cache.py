@@ -0,0 +1,57 @@
+'''Tests of the read cache: concurrent identical reads share one call, the writes make the later reads miss'''
+import threading
+import time
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init, ReadParams, CreateParams
+def get_cs(delay: float = 0) -> Init:
+    '''Init with a read cache on a fake api_call, the reads made in cs.reads'''
+    cs = Init(host = 'http://x').set_read_cache()
+    cs.reads, lock = [], threading.Lock()
+    def api_call(api: str, payload: dict):
+        if api.endswith('/crud/read'):
+            with lock:
+                cs.reads.append(payload['data']['table'])
+            time.sleep(delay)
+            return {'success': True, 'data': [{'n': len(cs.reads)}]}
+        return {'success': True, 'msg': 'written'}
+    cs.api_call = api_call
+    return cs
+def read(cs: Init, table: str = 'x') -> dict:
+    return cs.read(ReadParams(table = table))
+def test_concurrent_identical_reads_make_one_call():
+    cs = get_cs(delay = 0.2)
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(read(cs))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert cs.reads == ['x']
+    assert results == [{'success': True, 'data': [{'n': 1}]}] * 8
+    assert read(cs)['data'] == [{'n': 1}] # FROM THE CACHE
+    assert cs.reads == ['x']
+def test_a_write_makes_the_later_reads_miss():
+    cs = get_cs()
+    read(cs)
+    generation = cs._read_generation
+    cs.create(CreateParams(table = 'x', data = {'n': 0}))
+    assert cs._read_generation == generation + 1
+    assert read(cs)['data'] == [{'n': 2}]
+    cs.update(CreateParams(table = 'x', data = {'n': 0}))
+    assert read(cs)['data'] == [{'n': 3}]
+    assert cs.reads == ['x', 'x', 'x']
+def test_a_write_to_another_table_keeps_the_read():
+    cs = get_cs()
+    read(cs)
+    cs.create(CreateParams(table = 'y', data = {'n': 0}))
+    assert read(cs)['data'] == [{'n': 1}]
+    assert cs.reads == ['x']
+def test_a_write_during_the_read_is_not_cached_over():
+    cs = get_cs(delay = 0.2)
+    thread = threading.Thread(target = read, args = (cs, ))
+    thread.start()
+    time.sleep(0.05)
+    cs.create(CreateParams(table = 'x', data = {'n': 0})) # THE READ IN FLIGHT MAY NOT SEE IT
+    thread.join(5)
+    assert read(cs)['data'] == [{'n': 2}]
+    assert cs.reads == ['x', 'x']
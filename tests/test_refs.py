@@ -0,0 +1,43 @@
+'''Tests of the backfill refs: the periodicity_id is looked up in the periodicity table, never guessed'''
+import datetime
+import pytest
+from fakes import get_etl
+def get_refs_etl(periodicity_id, rows: list):
+    '''ETLReportBase of a base with the periodicity_id, the periodicity table rows served by the fake api'''
+    etl = get_etl([], [])
+    etl.data['etl_report_base']['data'][0]['periodicity_id'] = periodicity_id
+    etl.reads = 0
+    def api_call(api: str, payload: dict):
+        assert payload['data']['table'] == 'periodicity'
+        etl.reads += 1
+        return {'success': True, 'data': rows}
+    etl.cs.api_call = api_call
+    return etl
+ROWS = [
+    {'periodicity_id': 7, 'periodicity': 'Mensal'},
+    {'periodicity_id': 8, 'periodicity': 'Weekly'},
+    {'periodicity_id': 9, 'periodicity': 'Every full moon'}
+]
+def test_periodicity_from_the_server_table():
+    etl = get_refs_etl(7, ROWS)
+    assert etl.get_refs('2024-01-15', '2024-03-31') == [datetime.date(2024, 1, 31), datetime.date(2024, 2, 29), datetime.date(2024, 3, 31)]
+    etl.get_refs('2024-01-15', '2024-03-31')
+    assert etl.reads == 1
+def test_weekly_refs_are_week_ends():
+    etl = get_refs_etl(8, ROWS)
+    refs = etl.get_refs('2024-01-01', '2024-01-31')
+    assert refs[0] == datetime.date(2024, 1, 7)
+    assert all(ref.weekday() == 6 for ref in refs)
+def test_unknown_id_raises():
+    with pytest.raises(Exception, match = 'Unknown periodicity 1'):
+        get_refs_etl(1, ROWS).get_refs('2024-01-01', '2024-01-31')
+def test_unknown_name_raises():
+    with pytest.raises(Exception, match = 'Unknown periodicity 9'):
+        get_refs_etl(9, ROWS).get_refs('2024-01-01', '2024-01-31')
+def test_no_periodicity_raises():
+    with pytest.raises(Exception, match = 'No periodicity'):
+        get_refs_etl(None, ROWS).get_refs('2024-01-01', '2024-01-31')
+def test_periodicity_name_overrides_the_base():
+    etl = get_refs_etl(9, ROWS)
+    assert len(etl.get_refs('2024-01-01', '2024-01-31', periodicity = 'daily')) == 31
+    assert etl.reads == 0
@@ -0,0 +1,54 @@
+'''Tests of the item scheduler: get_plan, run_dag and the concurrent run_step, against a fake api_call'''
+import pytest
+from fakes import get_etl
+from central_set_cli import ETLReportBase
+def get_names(etl: ETLReportBase) -> list:
+    return [(log.get('type'), log.get('name')) for log in etl.get_logs()]
+def test_plan_defaults_to_the_previous_step():
+    etl = get_etl(['a', 'b'], [{'etl_rbase_output': 'x'}])
+    plan = {node['key']: node['deps'] for node in etl.get_plan()}
+    assert plan == {'extract/a': [], 'extract/b': [], 'transform/x': ['extract/a', 'extract/b']}
+def test_empty_depends_on_is_not_declared():
+    etl = get_etl(['a', 'b'], [{'etl_rbase_output': 'x', 'depends_on': ''}, {'etl_rbase_output': 'y', 'depends_on': []}])
+    plan = {node['key']: node['deps'] for node in etl.get_plan()}
+    assert plan['transform/x'] == ['extract/a', 'extract/b']
+    assert plan['transform/y'] == ['extract/a', 'extract/b']
+def test_declared_dependencies():
+    etl = get_etl(['a', 'b'], [{'etl_rbase_output': 'x', 'depends_on': 'a'}, {'etl_rbase_output': 'y', 'depends_on': 'extract/b; x'}])
+    plan = {node['key']: node['deps'] for node in etl.get_plan()}
+    assert plan['transform/x'] == ['extract/a']
+    assert plan['transform/y'] == ['extract/b', 'transform/x']
+def test_unresolved_dependency_raises():
+    etl = get_etl(['a'], [{'etl_rbase_output': 'x', 'depends_on': 'missing'}])
+    with pytest.raises(Exception, match = 'Unresolved dependency missing of transform/x'):
+        etl.get_plan()
+def test_dependency_on_an_action_without_items():
+    etl = get_etl(['a'], [{'etl_rbase_output': 'x', 'depends_on': 'export'}])
+    plan = {node['key']: node['deps'] for node in etl.get_plan()}
+    assert plan['transform/x'] == []
+def test_cycle_raises():
+    etl = get_etl([], [{'etl_rbase_output': 'x', 'depends_on': 'y'}, {'etl_rbase_output': 'y', 'depends_on': 'x'}])
+    with pytest.raises(Exception, match = 'Cyclic item dependencies'):
+        etl.run_dag()
+    assert etl.calls == []
+def test_failed_upstream_skips_downstream_but_not_notify():
+    etl = get_etl(['a', 'b'], [{'etl_rbase_output': 'x', 'depends_on': 'a'}, {'etl_rbase_output': 'y', 'depends_on': 'b'}], notify = ['n'], fail = ['a'])
+    etl.run_dag(max_workers = 2)
+    logs = {log.get('name'): log for log in etl.get_logs()}
+    assert logs['x']['success'] is False
+    assert logs['x']['msg'] == 'Skipped, upstream failed: extract/a'
+    assert logs['y']['success'] is True
+    assert 'x' not in etl.calls
+    assert 'n' in etl.calls
+    assert etl.dag_report['nodes']
+def test_dag_logs_keep_the_plan_order():
+    etl = get_etl(['a', 'b', 'c'], [{'etl_rbase_output': 'x'}], delays = {'a': 0.2, 'b': 0.1})
+    etl.run_dag(max_workers = 3)
+    assert etl.calls[:3] == ['c', 'b', 'a']
+    assert get_names(etl) == [('EXTRACT', 'a'), ('EXTRACT', 'b'), ('EXTRACT', 'c'), ('TRANSFORM', 'x')]
+def test_concurrent_step_logs_keep_the_item_order():
+    etl = get_etl(['a', 'b', 'c'], [], delays = {'a': 0.2, 'b': 0.1})
+    etl.allow_skip_conf = {**etl.allow_skip_conf, 'extract': {'concurrency': 3}}
+    etl.run_step(etl.steps[0])
+    assert etl.calls == ['c', 'b', 'a']
+    assert get_names(etl) == [('EXTRACT', 'a'), ('EXTRACT', 'b'), ('EXTRACT', 'c')]
@@ -0,0 +1,56 @@
+'''Tests of the token renewal against a fake login / crud api, with and without a token cache'''
+import base64
+import json
+import time
+import requests
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init, ReadParams, TokenCache
+def get_token(exp: float) -> str:
+    '''unsigned JWT with the exp claim'''
+    claims = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode('utf-8')).decode('utf-8').rstrip('=')
+    return f'e30.{claims}.sig'
+def get_response(status: int, res: dict) -> requests.Response:
+    r = requests.Response()
+    r.status_code = status
+    r._content = json.dumps(res).encode('utf-8')
+    r.headers['Content-Type'] = 'application/json'
+    return r
+def get_cs(token: str, ttl: float = 3600, **kwargs) -> Init:
+    '''Init on a fake server accepting the last token it handed out, the logins made in cs.logins'''
+    cs = Init(host = 'http://x', user = 'user', password = 'pass', token = token, **kwargs)
+    cs.logins = 0
+    server = {'token': token}
+    def _post(api: str, data, headers: dict) -> requests.Response:
+        if api.endswith('/dyn_api/login/login'):
+            cs.logins += 1
+            server['token'] = get_token(time.time() + ttl)
+            return get_response(200, {'success': True, 'token': server['token']})
+        if headers.get('Authorization') != f'Bearer {server["token"]}' or get_token_exp_passed(server['token']):
+            return get_response(401, {'success': False, 'msg': 'expired'})
+        return get_response(200, {'success': True, 'data': []})
+    cs._post = _post
+    return cs
+def get_token_exp_passed(token: str) -> bool:
+    claims = json.loads(base64.urlsafe_b64decode(token.split('.')[1] + '=='))
+    return claims['exp'] <= time.time()
+def test_renews_an_expiring_token_without_token_cache():
+    cs = get_cs(get_token(time.time() + 10))
+    assert cs.read(ReadParams(table = 'x')).get('success') is True
+    assert cs.logins == 1
+    assert cs.read(ReadParams(table = 'x')).get('success') is True
+    assert cs.logins == 1
+def test_renews_on_401_without_token_cache():
+    cs = get_cs(get_token(time.time() + 3600))
+    cs.token = get_token(time.time() + 3600) # NOT THE ONE THE SERVER KNOWS
+    cs._token_exp = time.time() + 3600
+    assert cs.read(ReadParams(table = 'x')).get('success') is True
+    assert cs.logins == 1
+def test_renews_with_token_cache(tmp_path):
+    cs = get_cs(get_token(time.time() + 10), token_cache = TokenCache(str(tmp_path / 'tokens.json')))
+    assert cs.read(ReadParams(table = 'x')).get('success') is True
+    assert cs.logins == 1
+def test_no_renewal_without_password():
+    cs = get_cs(get_token(time.time() - 1))
+    cs.password = None
+    assert cs.read(ReadParams(table = 'x')).get('success') is False
+    assert cs.logins == 0
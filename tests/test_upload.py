@@ -0,0 +1,45 @@
+'''Tests of the uploads: plain uploads by default, the streamed upload fails unless the server assembles it'''
+import json
+import pytest
+import requests
+import fakes # pylint: disable = unused-import
+from central_set_cli import Init
+def get_cs(assembles: bool) -> Init:
+    '''Init on a fake /upload, the forms posted in cs.forms'''
+    cs = Init(host = 'http://x', token = 't')
+    cs.forms = []
+    def post(api: str, headers: dict, data: dict = None, files: dict = None) -> requests.Response:
+        cs.forms.append(data)
+        res = {'success': True, 'msg': 'uploaded'}
+        if assembles and 'chunks' in data:
+            res['assembled'] = data['chunk'] == data['chunks'] - 1
+        r = requests.Response()
+        r.status_code = 200
+        r._content = json.dumps(res).encode('utf-8')
+        return r
+    cs.post = post
+    return cs
+@pytest.fixture
+def file_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv('CS_CACHE_DIR', str(tmp_path / 'cache'))
+    paths = []
+    for name in ['a.csv', 'b.csv']:
+        (tmp_path / name).write_bytes(name.encode('utf-8') * 2)
+        paths.append(str(tmp_path / name))
+    return paths
+def test_upload_many_defaults_to_plain_uploads(file_paths):
+    cs = get_cs(assembles = False)
+    res = cs.upload_many({'tmp': True}, file_paths)
+    assert all(r['success'] for r in res.values())
+    assert cs.forms == [{'tmp': True}, {'tmp': True}]
+def test_stream_is_assembled(file_paths):
+    cs = get_cs(assembles = True)
+    res = cs.upload_many({}, file_paths, stream = True, chunk_size = 4, checksum = False)
+    assert all(r['assembled'] for r in res.values())
+    assert len(cs.forms) == 6
+def test_stream_not_assembled_fails(file_paths):
+    cs = get_cs(assembles = False)
+    with pytest.raises(Exception, match = 'not assembled by the server'):
+        cs.upload_stream({}, file_paths[0], chunk_size = 4, checksum = False)
+    res = cs.upload_many({}, file_paths, stream = True, chunk_size = 4, checksum = False)
+    assert [r['success'] for r in res.values()] == [False, False]